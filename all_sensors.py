@@ -1,25 +1,48 @@
 import os
+import re
+import sys
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+import orjson
 import polars as pl
 import csv
 
 DATA_DIR = os.path.join(os.path.dirname(__file__) or ".", "data")
 DROP_COLUMNS = {"Mission_Milestone"}
+SENSORS_CACHE_PATH = os.path.join(DATA_DIR, ".sensors.cache.json")
+SENSORS_CACHE_VERSION = 2  # Bump whenever sensor name normalization changes
+
+# Matches file stems with at least three "_" fields whose last field is numeric
+_NUMBERED_SOURCE_RE = re.compile(r"([^_]*_[^_]*)_(?:.*_)?\d+")
+
+# The edeniss2020 source only depends on the directory, so it is resolved once per directory
+@lru_cache(maxsize=None)
+def _edeniss_source(dir_path):
+    parts = Path(dir_path).parts
+    if "edeniss2020" not in parts:
+        return "edeniss2020"
+    idx = parts.index("edeniss2020")
+    # None means the file sits directly in edeniss2020/ and its own name is the subsystem
+    return f"edeniss2020-{parts[idx + 1].lower()}" if len(parts) > idx + 1 else None
 
 # Function to get source from the file path
 def get_source(file_path):
-    path = Path(file_path)
     if "edeniss2020" in file_path.lower():
-        parts = path.parts
-        if "edeniss2020" in parts:
-            idx = parts.index("edeniss2020")
-            return f"edeniss2020-{parts[idx + 1].lower()}" if len(parts) > idx + 1 else "edeniss2020"
-        return "edeniss2020"
-    name = os.path.splitext(os.path.basename(file_path))[0]
-    if "_EDA" in name:
-        name = name.replace("_EDA", "")
-    parts = name.split("_")
-    return "_".join(parts[:2]) if len(parts) > 2 and parts[-1].isdigit() else name.lower()
+        dir_path, filename = os.path.split(file_path)
+        return _edeniss_source(dir_path) or f"edeniss2020-{filename.lower()}"
+    # Plain string ops here; building a Path per file is comparatively expensive
+    name = os.path.splitext(os.path.basename(file_path))[0].replace("_EDA", "")
+    # Names like APEX_03_..._2 collapse to their first two "_" fields
+    match = _NUMBERED_SOURCE_RE.fullmatch(name)
+    return match.group(1) if match else name.lower()
+
+# Read just the header row of a CSV; the data rows are never parsed
+def read_header(file_path):
+    with open(file_path, "rb") as f:
+        header = f.readline().decode("utf-8-sig", errors="ignore")
+    return next(csv.reader([header]), [])
 
 # Extract sensor names from files
 def extract_sensor_names(file_path):
@@ -27,61 +50,113 @@ def extract_sensor_names(file_path):
     source = get_source(file_path)
 
     try:
-        df = pl.read_csv(file_path, ignore_errors=True)
-
         # Drop unnecessary columns
-        for col in DROP_COLUMNS:
-            if col in df.columns:
-                df = df.drop(col)
+        cols = [c for c in read_header(file_path) if c not in DROP_COLUMNS]
 
         # If sensor names are in a dedicated column
-        for col in df.columns:
+        for col in cols:
             if col.lower() in ("sensor", "name"):
-                sensors.update(f"{source}-{s}".lower() for s in df[col].unique().to_list())
+                names = (
+                    pl.scan_csv(file_path, ignore_errors=True)
+                    .select(pl.col(col).unique())
+                    .collect(engine="streaming")
+                    .to_series()
+                    .to_list()
+                )
+                sensors.update(sys.intern(f"{source}-{s}".lower()) for s in names)
                 return sensors  # ✅ done
 
         # Otherwise assume sensors are in column headers (wide format)
-        ts_col = next((c for c in df.columns if "time" in c.lower() or "date" in c.lower()), df.columns[0])
-        sensor_cols = [col for col in df.columns if col != ts_col]
-        for sensor in sensor_cols:
-            clean = sensor.rstrip(".xy")
-            sensors.add(f"{source}-{clean}".lower())
+        ts_col = next((c for c in cols if "time" in c.lower() or "date" in c.lower()), cols[0])
+        sensor_cols = [col for col in cols if col != ts_col]
+        # Normalize all column names in one pass with polars string kernels
+        # Only the ".x"/".y" merge suffixes are dropped, not any trailing x/y/. characters
+        clean = pl.Series(sensor_cols, dtype=pl.Utf8).str.replace(r"\.[xy]$", "")
+        # Interned so the same id is shared with sensor_mapping keys and downstream consumers
+        sensors.update(map(sys.intern, (f"{source}-" + clean).str.to_lowercase().to_list()))
     except Exception:
         pass
 
     return sensors
 
+# Fingerprint the CSV files so the sensor cache is invalidated when any of them change
+def _data_signature(csv_paths):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"v{SENSORS_CACHE_VERSION}\n".encode())
+    for full_path in sorted(csv_paths):
+        st = os.stat(full_path)
+        digest.update(f"{full_path}|{st.st_mtime_ns}|{st.st_size}\n".encode())
+    return digest.hexdigest()
+
+def _read_sensors_cache(signature):
+    try:
+        with open(SENSORS_CACHE_PATH, "rb") as f:
+            cache = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    if cache.get("signature") != signature:
+        return None
+    sensors = cache.get("sensors")
+    return [sys.intern(s) for s in sensors] if sensors is not None else None
+
+def _write_sensors_cache(signature, sensors):
+    # Write to a temp file first so a concurrent reader never sees a half-written cache
+    tmp_path = f"{SENSORS_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps({"signature": signature, "sensors": sensors}))
+        os.replace(tmp_path, SENSORS_CACHE_PATH)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 # Load all sensors by iterating through the CSV files
 def load_all_sensors():
-    all_sensors = set()
+    csv_paths = []
     for root, _, files in os.walk(DATA_DIR):
         for filename in files:
             if filename.endswith(".csv"):
-                full_path = os.path.join(root, filename)
-                all_sensors.update(extract_sensor_names(full_path))
-    return sorted(all_sensors)
+                csv_paths.append(os.path.join(root, filename))
+
+    # Reuse the cached list when no CSV has been added, removed or modified
+    signature = _data_signature(csv_paths)
+    cached = _read_sensors_cache(signature)
+    if cached is not None:
+        return cached
+
+    # Header reads are I/O bound, so overlap them across a thread pool
+    all_sensors = set()
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for sensors in executor.map(extract_sensor_names, csv_paths):
+            all_sensors.update(sensors)
+    sensors = sorted(all_sensors)
+    _write_sensors_cache(signature, sensors)
+    return sensors
+
+_PATH_TO_ID = str.maketrans("/", "-")
 
 # Load sensor mappings from the CSV file (make sure to pass the correct file)
 def create_sensor_mapping(csv_file):
     sensor_mapping = {}
-    with open(csv_file, mode='r') as file:
-        reader = csv.DictReader(file)
+    with open(csv_file, mode='r', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        # Only three columns are used, so index rows by position instead of building a dict per row
+        path_idx = header.index('Path')
+        type_idx = header.index('Sensor Type (long)')
+        unit_idx = header.index('Unit')
         for row in reader:
             # Constructing the sensor identifier
-            sensor_id = f"edeniss2020-{row['Path'].replace('/', '-').replace('.csv', '').lower()}"
-            sensor_type_long = row['Sensor Type (long)']
-            unit = row['Unit']
-            
+            sensor_id = sys.intern(f"edeniss2020-{row[path_idx].translate(_PATH_TO_ID).removesuffix('.csv').lower()}")
+
             # Mapping sensor to its general type and unit
             sensor_mapping[sensor_id] = {
-                'parameter': sensor_type_long,
-                'unit': unit
+                'parameter': row[type_idx],
+                'unit': row[unit_idx]
             }
     return sensor_mapping
 
-# Assuming you have a file 'edeniss2020_updated.csv' with the updated sensor mapping
-sensor_mapping = create_sensor_mapping('edeniss2020_updated.csv')
-
 # Add APEX and VEG sensors
 apex_sensors = {
     'apex_03-rh_percent_ground_hardware': {'parameter': 'Relative Humidity', 'unit': 'percent'},
@@ -110,11 +185,26 @@ veg_sensors = {
     'veg_01c-temp_degc_iss_hardware': {'parameter': 'Temperature', 'unit': 'degrees celsius'}
 }
 
-# Update sensor_mapping with APEX and VEG sensors  
-sensor_mapping.update(apex_sensors)
-sensor_mapping.update(veg_sensors)
+# Build the full mapping: edeniss2020 sensors from the mapping file plus APEX and VEG sensors
+def build_sensor_mapping(csv_file='edeniss2020_updated.csv'):
+    sensor_mapping = create_sensor_mapping(csv_file)
+    sensor_mapping.update(apex_sensors)
+    sensor_mapping.update(veg_sensors)
+    return sensor_mapping
+
+# The mapping and sensor list are built on first access (PEP 562) rather than at import,
+# so importing this module for its helpers does not read any CSV files.
+# merged_sensor_data is kept as an alias of sensor_mapping for existing callers.
+_LAZY_LOADERS = {
+    "sensor_mapping": build_sensor_mapping,
+    "merged_sensor_data": lambda: sys.modules[__name__].sensor_mapping,
+    "ALL_SENSORS": load_all_sensors,
+}
 
-# Now merge the sensors and their parameters
-merged_sensor_data = {}
-for sensor in sensor_mapping:
-    merged_sensor_data[sensor] = sensor_mapping[sensor]
\ No newline at end of file
+def __getattr__(name):
+    loader = _LAZY_LOADERS.get(name)
+    if loader is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = loader()
+    globals()[name] = value
+    return value
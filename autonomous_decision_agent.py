@@ -11,8 +11,7 @@ from datetime import datetime
 from typing import List, Dict, Any
 
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from openai import AsyncOpenAI
 
 from environmental_thresholds import thresholds
 
@@ -20,6 +19,8 @@ load_dotenv()
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+MAX_CONCURRENT_CYCLES = 8  # Upper bound on in-flight LLM requests in run_many
+
 AVAILABLE_ACTIONS = [
             "trigger_alarm", "notify_team", "activate_water_dispenser", "deactivate_water_dispenser",
             "log_status", "run_metagenomics_analysis", "increase_fan_speed", "decrease_fan_speed",
@@ -29,15 +30,7 @@ AVAILABLE_ACTIONS = [
             "dispense_ph_up", "run_rnaseq_analysis", "schedule_retest"
         ]
 
-class AutonomousDecisionAgent:
-    def __init__(self, model="gpt-4o", temperature=0):
-        self.llm_enabled = bool(os.getenv("OPENAI_API_KEY"))
-        if not self.llm_enabled:
-            logger.warning("LLM is disabled.")
-            return
-
-        self.llm = ChatOpenAI(model=model, temperature=temperature)
-        self.system_message = SystemMessage(content="""
+SYSTEM_PROMPT = """
 You are the autonomous control agent for a Lunar Agriculture Pod.
 
 Your mission is to safeguard plant health by managing environmental conditions using the systems available to you. Your decisions must be rooted in mechanical reality and biological reasoning. Do not make vague statements like "adjust humidity." Instead, describe exactly what system you have activated, how it works, and how you will return the pod to nominal.
@@ -146,45 +139,30 @@ Be consistent in the way you take actions, and don't forget to turn off or deact
 
 DO NOT TRIGGER THE RESPONSE PROTOCOL OR OUTPUT FORMAT UNLESS THE USER REQUESTS IT OR AN ANOMALY IS DETECTED.
 
-""")
-
-    def _parse_timestamp(self, ts: Any) -> datetime:
-        if isinstance(ts, datetime): return ts
-        try:
-            return datetime.fromisoformat(str(ts).replace('Z', '+00:00'))
-        except (ValueError, TypeError):
-            return datetime.min
+"""
 
-    def generate_decision_prompt(self, anomalies: List[Dict[str, Any]]) -> HumanMessage:
-        """
-        Generates the final, definitive, and re-ordered prompt for the AI.
-        """
-        anomaly_summary = [
-            f"- {self._parse_timestamp(a.get('timestamp')).strftime('%Y-%m-%d %H:%M:%S')}: sensor '{a.get('sensor')}' ({a.get('parameter')}) reported a '{a.get('threshold_type')}' anomaly with a value of {a.get('value')}."
-            for a in anomalies[:30]
-        ]
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
 
-        optimal_ranges_summary = [
-            f"- {param}: {values.get('optimal')} (Unit: {values.get('unit', 'N/A')})".strip()
-            for param, values in thresholds.items()
-        ]
-
-        # --- THIS IS THE FINAL, RE-ORDERED AND MOST EXPLICIT PROMPT ---
-        prompt_content = prompt_content = f"""
+# Static parts of the decision prompt, split around the per-call timestamp and anomaly report
+DECISION_PROMPT_PREFIX = """
 **MISSION CRITICAL ANALYSIS & ACTION FORMULATION**
 
 **SYSTEM:** Lunar Habitat Autonomous Control  
-**TIME:** {datetime.now().isoformat()}
+**TIME:** """
+
+DECISION_PROMPT_MIDDLE = """
 
 **SITUATION:**  
 You are the autonomous control agent responsible for environmental regulation in a lunar habitat.  
 The following anomalies have been detected and must be analyzed immediately:
 
 **ANOMALY REPORT:**  
-{chr(10).join(f"- {line}" for line in anomaly_summary)}
+"""
+
+DECISION_PROMPT_SUFFIX_TEMPLATE = """
 
 **OPERATIONAL PARAMETERS (OPTIMAL RANGES):**  
-{chr(10).join(f"- {line}" for line in optimal_ranges_summary)}
+{optimal_ranges}
 
 ---
 
@@ -242,19 +220,83 @@ Also, here's a list of things you can and cannot control in the pod:
 - Astronaut behavior or mission decisions
 - Structural design of the pod
 """
-        return HumanMessage(content=prompt_content)
+
+class AutonomousDecisionAgent:
+    def __init__(self, model="gpt-4o", temperature=0):
+        # thresholds is static for the lifetime of the process, so format it once
+        optimal_ranges_summary = [
+            f"- {param}: {values.get('optimal')} (Unit: {values.get('unit', 'N/A')})".strip()
+            for param, values in thresholds.items()
+        ]
+        self._optimal_ranges_block = chr(10).join(f"- {line}" for line in optimal_ranges_summary)
+        self._decision_prompt_suffix = DECISION_PROMPT_SUFFIX_TEMPLATE.format(
+            optimal_ranges=self._optimal_ranges_block
+        )
+        self.llm_enabled = bool(os.getenv("OPENAI_API_KEY"))
+        if not self.llm_enabled:
+            logger.warning("LLM is disabled.")
+            return
+
+        # Single-message calls with no tools, so the OpenAI client is used directly
+        # rather than through a LangChain chat model.
+        self.client = AsyncOpenAI(max_retries=2, timeout=30)
+        self.model = model
+        self.temperature = temperature
+        # Shared instance: the system prompt stays byte-identical across calls so the
+        # provider-side prompt cache can reuse it.
+        self.system_message = SYSTEM_MESSAGE
+
+    def _parse_timestamp(self, ts: Any) -> datetime:
+        if isinstance(ts, datetime): return ts
+        try:
+            # fromisoformat accepts a trailing 'Z' natively on Python 3.11+
+            return datetime.fromisoformat(ts)
+        except (ValueError, TypeError):
+            return datetime.min
+
+    def _format_anomaly(self, anomaly: Dict[str, Any]) -> str:
+        # Anomalies built outside the detector may omit fields, so keep .get() semantics
+        get = anomaly.get
+        ts = self._parse_timestamp(get('timestamp')).strftime('%Y-%m-%d %H:%M:%S')
+        return f"- {ts}: sensor '{get('sensor')}' ({get('parameter')}) reported a '{get('threshold_type')}' anomaly with a value of {get('value')}."
+
+    def generate_decision_prompt(self, anomalies: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Generates the final, definitive, and re-ordered prompt for the AI.
+        """
+        # Joined straight from a generator; no intermediate list of lines
+        anomaly_block = chr(10).join(f"- {self._format_anomaly(a)}" for a in anomalies[:30])
+
+        # Only the timestamp and anomaly report change between calls; the static parts
+        # are prebuilt so this is plain concatenation.
+        prompt_content = (
+            DECISION_PROMPT_PREFIX + datetime.now().isoformat()
+            + DECISION_PROMPT_MIDDLE + anomaly_block + self._decision_prompt_suffix
+        )
+        return {"role": "user", "content": prompt_content}
 
     async def run_autonomous_cycle(self, anomalies_for_decision: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Runs the agent on a specific batch of anomalies using a direct LLM call."""
         if not self.llm_enabled or not anomalies_for_decision:
             return {"raw_output": "URGENCY: NONE\nIMMEDIATE_ACTIONS: None\nREASONING: LLM disabled or no anomalies to process."}
 
-        human_message = self.generate_decision_prompt(anomalies_for_decision)
-        messages = [self.system_message, human_message]
+        messages = [self.system_message, self.generate_decision_prompt(anomalies_for_decision)]
         
         try:
-            response = await self.llm.ainvoke(messages)
-            return {"raw_output": response.content}
+            response = await self.client.chat.completions.create(
+                model=self.model, temperature=self.temperature, messages=messages
+            )
+            return {"raw_output": response.choices[0].message.content or ""}
         except Exception as e:
             logger.error(f"LLM direct invocation failed: {e}", exc_info=True)
-            return {"raw_output": f"URGENCY: ERROR\nREASONING: An error occurred during AI processing: {e}"}
\ No newline at end of file
+            return {"raw_output": f"URGENCY: ERROR\nREASONING: An error occurred during AI processing: {e}"}
+
+    async def run_many(self, anomaly_batches: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Runs several anomaly batches concurrently, keeping at most MAX_CONCURRENT_CYCLES requests in flight."""
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_CYCLES)
+
+        async def run_one(batch):
+            async with semaphore:
+                return await self.run_autonomous_cycle(batch)
+
+        return await asyncio.gather(*(run_one(batch) for batch in anomaly_batches))
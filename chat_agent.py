@@ -5,54 +5,140 @@ Fully integrated version with direct access to AutonomousDecisionAgent and Lunar
 """
 
 
-import cv2
-import numpy as np
 import os
+import re
+import sys
 import asyncio
 import time
-from langchain.agents import initialize_agent, Tool
-from langchain.agents.agent_types import AgentType
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_community.tools.arxiv.tool import ArxivQueryRun
-# from langchain_community.tools.pubmed import PubMedQueryRun
-from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
-from langchain_community.utilities.wikipedia import WikipediaAPIWrapper
-from langchain_openai import ChatOpenAI
-
-from autonomous_decision_agent import AutonomousDecisionAgent
-from lunar_agent_system import LunarAgentSystem
-from environmental_thresholds import thresholds
-from plant_image_detect import find_plant_vert_height, segment_plant_by_green
-
-# ----------------------------
-# TOOLS
-# ----------------------------
+import threading
+import queue
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from datetime import datetime
 
-search_tool = Tool(
-    name="Search",
-    func=DuckDuckGoSearchRun().run,
-    description="Use for general science or anomaly-related web lookups."
-)
+import orjson
 
-wiki_tool = Tool(
-    name="Wikipedia",
-    func=WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper()).run,
-    description="Use for looking up scientific or technical concepts."
-)
+from environmental_thresholds import thresholds
 
-# pubmed_tool = Tool(
-#     name="PubMed",
-#     func=PubMedQueryRun().run,
-#     description="Use to find scientific articles in biology or space farming."
-# )
+# Heavy dependencies (OpenCV, pandas, LangChain, the decision agent and pod system)
+# are imported on first use so the REPL starts without loading all of them.
 
-arxiv_tool = Tool(
-    name="Arxiv",
-    func=ArxivQueryRun().run,
-    description="Use to find recent research papers on lunar systems, AI, or automation."
+# Chat commands that map straight onto a simulated pod action
+SIMULATE_ROUTES = (
+    (("simulate fan", "turn on fan"), "activate_fans"),
+    (("simulate co2",), "decrease_co2"),
+    (("simulate humidity",), "increase_humidity"),
 )
-
-tools = [search_tool, wiki_tool, arxiv_tool]
+# "/simulate_action <cmd>" and "/run_decision"; group 2 holds the command argument
+SLASH_COMMAND_RE = re.compile(r"/(simulate_action|run_decision)(.*)", re.IGNORECASE | re.DOTALL)
+
+# Intent keywords for chat(); a message matches a group if it contains any of them
+HUMIDITY_KEYWORDS = ("humidity", "rh")
+IMAGE_KEYWORDS = ("image", "plant color", "yellow", "green")
+DETECTION_KEYWORDS = ("anomaly", "signal", "detect")
+
+MIN_PLANT_BBOX_AREA = 500
+
+# Appended to every agent turn; the thresholds table is serialized once, as compact JSON
+THRESHOLDS_SUFFIX = ", act and make decisions based on these thresholds: " + orjson.dumps(thresholds).decode()
+
+# Images are analysed at full resolution. REDUCED_RES_ANALYSIS=1 decodes them at half
+# size (a quarter of the pixels) and scales the pixel-count thresholds to match; the
+# blur and morphology kernels are sized in pixels, though, so the plant mask and the
+# colour ratios shift and images near the anomaly thresholds can flip.
+REDUCED_RES_ANALYSIS = os.getenv("REDUCED_RES_ANALYSIS") == "1"
+PIXEL_SCALE = 4 if REDUCED_RES_ANALYSIS else 1
+
+# Directory scanned by the image monitoring check; the check is skipped when LUNAR_IMAGE_DIR is unset
+IMAGE_DIR = os.getenv("LUNAR_IMAGE_DIR")
+MAX_MONITORED_IMAGES = 10
+
+def _list_images(image_dir, limit):
+    """Returns up to limit .jpg paths from image_dir, stopping the scan once enough are found."""
+    paths = []
+    try:
+        with os.scandir(image_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".jpg") and entry.is_file():
+                    paths.append(entry.path)
+                    if len(paths) == limit:
+                        break
+    except FileNotFoundError:
+        pass
+    return paths
+
+def _control_image_available():
+    """Segmentation diffs every image against the control image, so without it there is nothing to analyse."""
+    from plant_image_detect import CONTROL_IMG_PATH
+    if os.path.isfile(CONTROL_IMG_PATH):
+        return True
+    print(f"Control image not found at {CONTROL_IMG_PATH}; skipping image analysis.", file=sys.stderr)
+    return False
+
+def _analyze_image(image_path):
+    """
+    Computes the green and yellow ratios of the plant pixels in one image.
+    Returns (filename, green_ratio, yellow_ratio, is_anomaly, report_line),
+    or None when no plant is detected.
+    """
+    import cv2
+    from plant_image_detect import segment_and_classify
+
+    filename = os.path.basename(image_path)
+    read_flag = cv2.IMREAD_REDUCED_COLOR_2 if REDUCED_RES_ANALYSIS else cv2.IMREAD_COLOR
+    image_bgr = cv2.imread(image_path, read_flag)
+    # Segmentation and the green/yellow counts share one HSV conversion; plant bounding
+    # boxes smaller than MIN_PLANT_BBOX_AREA (full-res pixels) are noise rather than a plant.
+    counts = segment_and_classify(
+        image_bgr,
+        green_threshold=5000 // PIXEL_SCALE,
+        min_bbox_area=MIN_PLANT_BBOX_AREA // PIXEL_SCALE
+    )
+    if counts is None:
+        return None
+    green_pixels, yellow_pixels, total_pixels = counts
+    green_ratio = green_pixels / total_pixels if total_pixels > 0 else 0
+    yellow_ratio = yellow_pixels / total_pixels if total_pixels > 0 else 0
+    report_line = f"{filename}: Green ratio={green_ratio:.2f}, Yellow ratio={yellow_ratio:.2f}\n"
+    is_anomaly = green_ratio < 0.45 and yellow_ratio > 0.5
+    return filename, green_ratio, yellow_ratio, is_anomaly, report_line
+
+# Known pathogens per plant and amplicon marker, built once at import.
+# Frozensets keep the membership checks O(1) as the lists grow.
+PLANT_PATHOGEN_DB = {
+    "fragaria": {
+        "16S": frozenset({"Xanthomonas fragariae", "Pectobacterium carotovorum"}),
+        "ITS": frozenset({"Mycosphaerella fragariae"})
+    },
+    # Add more plants and their known pathogens here
+    "solanum": {
+        "16S": frozenset({"Ralstonia solanacearum"}),
+        "ITS": frozenset({"Alternaria solani"})
+    },
+    "arabidopsis": {
+        "16S": frozenset({"Pseudomonas syringae"}),
+        "ITS": frozenset({"Botrytis cinerea"})
+    }
+}
+
+def _read_taxonomy_counts(path, genus_col):
+    """
+    Reads the genus, species and count columns of a taxonomy-and-counts TSV in one
+    columnar pass. The 16S reports start those columns at index 6, ITS reports at 7.
+    Returns a DataFrame with "full_name" ("Genus species") and "count".
+    """
+    import pandas as pd
+
+    taxa = pd.read_csv(
+        path, sep="\t", header=0,
+        usecols=[genus_col, genus_col + 1, genus_col + 2],
+        names=["genus", "species", "count"],
+        dtype={"genus": str, "species": str, "count": "int64"},
+        keep_default_na=False,  # keep "NA" species as literal text
+    )
+    taxa["full_name"] = (taxa["genus"] + " " + taxa["species"]).str.strip()
+    return taxa
 
 # ----------------------------
 # PROMPT + AGENT SETUP
@@ -181,40 +267,185 @@ DO NOT TRIGGER THE RESPONSE PROTOCOL OR OUTPUT FORMAT UNLESS THE USER REQUESTS I
 Only use the full protocol if the user requests an action, diagnosis, or anomaly response.
 """
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
+# ----------------------------
+# TOOLS + AGENT (built on first use)
+# ----------------------------
 
-
-executor = initialize_agent(
-    tools,
-    llm,
-    agent=AgentType.OPENAI_FUNCTIONS,
-    verbose=False,
-    handle_parsing_errors=True,
-    agent_kwargs={"system_message": system_prompt}
-)
+def _build_tools():
+    from langchain.agents import Tool
+    from langchain_community.tools import DuckDuckGoSearchRun
+    from langchain_community.tools.arxiv.tool import ArxivQueryRun
+    # from langchain_community.tools.pubmed import PubMedQueryRun
+    from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
+    from langchain_community.utilities.wikipedia import WikipediaAPIWrapper
+
+    search_tool = Tool(
+        name="Search",
+        func=DuckDuckGoSearchRun().run,
+        description="Use for general science or anomaly-related web lookups."
+    )
+
+    wiki_tool = Tool(
+        name="Wikipedia",
+        func=WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper()).run,
+        description="Use for looking up scientific or technical concepts."
+    )
+
+    # pubmed_tool = Tool(
+    #     name="PubMed",
+    #     func=PubMedQueryRun().run,
+    #     description="Use to find scientific articles in biology or space farming."
+    # )
+
+    arxiv_tool = Tool(
+        name="Arxiv",
+        func=ArxivQueryRun().run,
+        description="Use to find recent research papers on lunar systems, AI, or automation."
+    )
+
+    return [search_tool, wiki_tool, arxiv_tool]
+
+@lru_cache(maxsize=1)
+def _get_loop():
+    """
+    The background event loop every ChatAgent runs its turns on. A single long-lived
+    loop lets pooled HTTP connections survive between calls (asyncio.run would close
+    them with its loop), and the executor's client is only ever used from this loop.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+@lru_cache(maxsize=1)
+def _get_executor():
+    from langchain.agents import initialize_agent
+    from langchain.agents.agent_types import AgentType
+    from llm_client import get_llm
+
+    # Only reached from coroutines on _get_loop(), so the cached executor stays on that loop
+    llm = get_llm("gpt-4o")
+
+    # The multi-function agent can request several tool calls in one step; AgentExecutor
+    # then awaits them together, so Search/Wikipedia/Arxiv lookups overlap instead of
+    # running back to back.
+    return initialize_agent(
+        _build_tools(),
+        llm,
+        agent=AgentType.OPENAI_MULTI_FUNCTIONS,
+        verbose=False,
+        handle_parsing_errors=True,
+        agent_kwargs={"system_message": system_prompt}
+    )
 
 # ----------------------------
 # CHAT AGENT CLASS
 # ----------------------------
 
+class _LogWriter:
+    """Background writer for the decision/anomaly logs.
+
+    Entries are queued from the chat thread and written by a daemon thread that keeps
+    the .jsonl files open and flushes once per drained batch. A failed write is kept
+    and raised on the chat thread by the next raise_pending_error() call.
+    """
+
+    BATCH_SIZE = 64
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._handles = {}
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, path, record):
+        self._queue.put((path, "a", orjson.dumps(record) + b"\n"))
+
+    def replace(self, path, record):
+        self._queue.put((path, "w", orjson.dumps(record)))
+
+    def raise_pending_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _write(self, path, mode, payload):
+        if mode == "w":
+            # Write to a temp file first so the dashboard never reads a half-written file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            return
+        handle = self._handles.get(path)
+        if handle is None:
+            handle = self._handles[path] = open(path, "ab")
+        handle.write(payload)
+
+    def _fail(self, path, error):
+        message = f"Log write failed for {path}: {error}"
+        print(message, file=sys.stderr)
+        self._error = OSError(message)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for entry in batch:
+                if entry is None:
+                    stop = True
+                    continue
+                try:
+                    self._write(*entry)
+                except OSError as e:
+                    self._fail(entry[0], e)
+            for path, handle in self._handles.items():
+                try:
+                    handle.flush()
+                except OSError as e:
+                    self._fail(path, e)
+            if stop:
+                for handle in self._handles.values():
+                    handle.close()
+                self._handles.clear()
+                return
+
+
+@lru_cache(maxsize=1)
+def _get_log_writer():
+    # Started on the first logged turn, not at import (the dashboard imports this module)
+    return _LogWriter()
+
+
 class ChatAgent:
     def _log_decision(self, reasoning, response_plan, raw_output):
-        import json
-        from datetime import datetime
         decision = {
             "reasoning": reasoning,
             "response_plan": response_plan,
             "timestamp": datetime.now().isoformat(),
             "raw_output": raw_output
         }
-        with open("data/last_decision.json", "w") as f:
-            json.dump(decision, f)
-        with open("data/last_decision.jsonl", "a") as f:
-            f.write(json.dumps(decision) + "\n")
+        log_writer = _get_log_writer()
+        log_writer.replace("data/last_decision.json", decision)
+        log_writer.append("data/last_decision.jsonl", decision)
+        log_writer.raise_pending_error()
 
     def _log_anomaly(self, sensor, value, anomaly_type, description):
-        import json
-        from datetime import datetime
         anomaly = {
             "timestamp": datetime.now().isoformat(),
             "sensor": sensor,
@@ -222,56 +453,117 @@ class ChatAgent:
             "type": anomaly_type,
             "description": description
         }
-        with open("data/decision_log.jsonl", "a") as f:
-            f.write(json.dumps(anomaly) + "\n")
+        log_writer = _get_log_writer()
+        log_writer.append("data/decision_log.jsonl", anomaly)
+        log_writer.raise_pending_error()
+
+    @staticmethod
+    def _build_file_index(search_dir):
+        """Map each file name under search_dir to the first path os.walk finds for it."""
+        index = {}
+        for root, dirs, files in os.walk(search_dir):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]  # skip .git and friends
+            for name in files:
+                index.setdefault(name, os.path.join(root, name))
+        return index
+
     def _find_file(self, filename, search_dir=None):
         """Search for a file by name in the workspace, return its full path or None."""
-        import os
-        if search_dir is None:
-            search_dir = os.path.dirname(__file__)
-        for root, dirs, files in os.walk(search_dir):
-            if filename in files:
-                return os.path.join(root, filename)
-        return None
+        if search_dir is not None:
+            return self._build_file_index(search_dir).get(filename)
+        # The workspace is walked once and reused across chat turns; a miss
+        # rebuilds the index in case the file was added since.
+        if self._file_index is None or filename not in self._file_index:
+            self._file_index = self._build_file_index(os.path.dirname(__file__) or ".")
+        return self._file_index.get(filename)
+
     def __init__(self):
-        self.executor = executor
-        self.decision_agent = AutonomousDecisionAgent()
-        self.lunar_system = LunarAgentSystem()
+        self._file_index = None
+        self._decision_agent = None
+        self._lunar_system = None
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+    @property
+    def executor(self):
+        return _get_executor()
+
+    @property
+    def decision_agent(self):
+        if self._decision_agent is None:
+            from autonomous_decision_agent import AutonomousDecisionAgent
+            self._decision_agent = AutonomousDecisionAgent()
+        return self._decision_agent
+
+    @property
+    def lunar_system(self):
+        if self._lunar_system is None:
+            from lunar_agent_system import LunarAgentSystem
+            self._lunar_system = LunarAgentSystem()
+        return self._lunar_system
+
+    def _parse_taxonomy_files(self, plant_name, pathogens_by_marker):
+        """Build the taxonomy report and pathogen hits (count >= 10) for a plant's 16S/ITS files."""
+        detected_pathogens = []
+        pathogen_counts = {}
+        taxonomy_report = ""
+        # Find files regardless of location
+        file_16S = self._find_file(f"{plant_name.capitalize()}_GAmplicon_16S-taxonomy-and-counts.tsv")
+        file_ITS = self._find_file(f"{plant_name.capitalize()}_GAmplicon_ITS-taxonomy-and-counts.tsv")
+        for label, path, genus_col in (("16S", file_16S, 6), ("ITS", file_ITS, 7)):
+            pathogens = pathogens_by_marker[label]
+            try:
+                if path:
+                    taxa = _read_taxonomy_counts(path, genus_col)
+                    nonzero = taxa[taxa["count"] > 0]
+                    taxonomy_report += "".join(f"{label}: " + nonzero["full_name"] + " - " + nonzero["count"].astype(str) + "\n")
+                    # Only report and treat plant pathogens with count >= 10
+                    hits = taxa[taxa["full_name"].isin(pathogens) & (taxa["count"] >= 10)]
+                    detected_pathogens.extend(hits["full_name"].tolist())
+                    pathogen_counts.update(zip(hits["full_name"].tolist(), hits["count"].tolist()))
+                else:
+                    taxonomy_report += f"{label} report error: file not found\n"
+            except Exception as e:
+                taxonomy_report += f"{label} report error: {e}\n"
+        return taxonomy_report, detected_pathogens, pathogen_counts
 
     def chat(self, user_input: str) -> str:
         try:
             lower = user_input.lower()
 
+            # Fixed simulation commands are dispatched before any LLM call
+            for phrases, action in SIMULATE_ROUTES:
+                if any(phrase in lower for phrase in phrases):
+                    return self.lunar_system.execute_action(action)
+
+            command = SLASH_COMMAND_RE.search(user_input)
+            if command and command.group(1).lower() == "simulate_action":
+                return self.lunar_system.execute_action(command.group(2).strip())
+
+            if command and command.group(1).lower() == "run_decision":
+                anomalies = [{
+                    "timestamp": "2025-07-29T14:05:00",
+                    "sensor": "VEG_01AB-temp_degc_iss_hardware",
+                    "value": 29.5,
+                    "type": "trend"
+                }]
+                result = self._run(self.decision_agent.run_autonomous_cycle(anomalies))
+                return result["raw_output"]
+
             # Generalized anomaly and metagenomics protocol for any plant
             # Detect plant name from user input (default to Fragaria if not found)
-            plant_pathogen_db = {
-                "fragaria": {
-                    "16S": ["Xanthomonas fragariae", "Pectobacterium carotovorum"],
-                    "ITS": ["Mycosphaerella fragariae"]
-                },
-                # Add more plants and their known pathogens here
-                "solanum": {
-                    "16S": ["Ralstonia solanacearum"],
-                    "ITS": ["Alternaria solani"]
-                },
-                "arabidopsis": {
-                    "16S": ["Pseudomonas syringae"],
-                    "ITS": ["Botrytis cinerea"]
-                }
-            }
             # Find plant name in user input
             plant_name = None
-            for key in plant_pathogen_db.keys():
+            for key in PLANT_PATHOGEN_DB.keys():
                 if key in lower:
                     plant_name = key
                     break
-            if ("humidity" in lower or "rh" in lower) and ("85" in lower or plant_name):
+            if any(k in lower for k in HUMIDITY_KEYWORDS) and ("85" in lower or plant_name):
                 if not plant_name:
                     plant_name = "fragaria"  # Default
                 # Step 1: Trigger usual response protocol
-                anomaly_input = f"user_input: {user_input}, act and make decisions based on these thresholds: {thresholds}"
-                protocol_response = asyncio.run(self._async_chat(anomaly_input))
-
+                anomaly_input = "user_input: " + user_input + THRESHOLDS_SUFFIX
                 # Step 2: Trigger metagenomics analysis
                 metagenomics_steps = [
                     f"Metagenomics (Amplicon, 16S and ITS) analysis triggered for {plant_name.capitalize()}...",
@@ -279,60 +571,18 @@ class ChatAgent:
                     "Automatic data processing completed.",
                     "...Output report of % taxonomy generated."
                 ]
-                # Step 3: Parse taxonomy files
-                pathogens_16S = plant_pathogen_db[plant_name]["16S"]
-                pathogens_ITS = plant_pathogen_db[plant_name]["ITS"]
-                detected_pathogens = []
-                pathogen_counts = {}
-                taxonomy_report = ""
+                # Step 3: Parse taxonomy files while the protocol reply is generated
                 screening_report = f"Screening detected taxonomies for {plant_name.capitalize()}-specific pathogens...\n"
                 # literature_links removed
-                # Find files regardless of location
-                file_16S = self._find_file(f"{plant_name.capitalize()}_GAmplicon_16S-taxonomy-and-counts.tsv")
-                file_ITS = self._find_file(f"{plant_name.capitalize()}_GAmplicon_ITS-taxonomy-and-counts.tsv")
-                # 16S
-                try:
-                    if file_16S:
-                        with open(file_16S, "r") as f:
-                            lines = f.readlines()[1:]
-                            for line in lines:
-                                parts = line.strip().split("\t")
-                                genus = parts[6]
-                                species = parts[7]
-                                count = int(parts[8])
-                                full_name = f"{genus} {species}".strip()
-                                if count > 0:
-                                    taxonomy_report += f"16S: {full_name} - {count}\n"
-                                # Only report and treat plant pathogens with count >= 10
-                                if full_name in pathogens_16S and count >= 10:
-                                    detected_pathogens.append(full_name)
-                                    pathogen_counts[full_name] = count
-                                    pass  # literature links removed
-                    else:
-                        taxonomy_report += "16S report error: file not found\n"
-                except Exception as e:
-                    taxonomy_report += f"16S report error: {e}\n"
-                # ITS
-                try:
-                    if file_ITS:
-                        with open(file_ITS, "r") as f:
-                            lines = f.readlines()[1:]  # skip header
-                            for line in lines:
-                                parts = line.strip().split("\t")
-                                genus = parts[7]
-                                species = parts[8]
-                                count = int(parts[9])
-                                full_name = f"{genus} {species}".strip()
-                                if count > 0:
-                                    taxonomy_report += f"ITS: {full_name} - {count}\n"
-                                if full_name in pathogens_ITS and count >= 10:
-                                    detected_pathogens.append(full_name)
-                                    pathogen_counts[full_name] = count
-                                    pass  # literature links removed
-                    else:
-                        taxonomy_report += "ITS report error: file not found\n"
-                except Exception as e:
-                    taxonomy_report += f"ITS report error: {e}\n"
+
+                async def protocol_and_taxonomy():
+                    return await asyncio.gather(
+                        self._async_chat(anomaly_input),
+                        asyncio.to_thread(self._parse_taxonomy_files, plant_name, PLANT_PATHOGEN_DB[plant_name])
+                    )
+
+                protocol_response, (taxonomy_report, detected_pathogens, pathogen_counts) = \
+                    self._run(protocol_and_taxonomy())
                 # Step 4: Evaluate for pathogens and dispense treatment
                 treatment_log = ""
                 if detected_pathogens:
@@ -360,67 +610,32 @@ class ChatAgent:
                     "value": 29.5,
                     "type": "trend"
                 }]
-                result = asyncio.run(self.decision_agent.run_autonomous_cycle(anomalies))
-                return result["raw_output"]
-
-            if "simulate fan" in lower or "turn on fan" in lower:
-                return self.lunar_system.execute_action("activate_fans")
-
-            if "simulate co2" in lower:
-                return self.lunar_system.execute_action("decrease_co2")
-
-            if "simulate humidity" in lower:
-                return self.lunar_system.execute_action("increase_humidity")
-
-            if "/simulate_action" in lower:
-                action = user_input.split("/simulate_action")[-1].strip()
-                return self.lunar_system.execute_action(action)
-
-            if "/run_decision" in lower:
-                anomalies = [{
-                    "timestamp": "2025-07-29T14:05:00",
-                    "sensor": "VEG_01AB-temp_degc_iss_hardware",
-                    "value": 29.5,
-                    "type": "trend"
-                }]
-                result = asyncio.run(self.decision_agent.run_autonomous_cycle(anomalies))
+                result = self._run(self.decision_agent.run_autonomous_cycle(anomalies))
                 return result["raw_output"]
 
             # Main agent response with image monitoring augmentation
-            image_monitoring_trigger = ("image" in lower or "plant color" in lower or "yellow" in lower or "green" in lower) and ("anomaly" in lower or "signal" in lower or "detect" in lower)
+            image_monitoring_trigger = any(k in lower for k in IMAGE_KEYWORDS) and any(k in lower for k in DETECTION_KEYWORDS)
             color_report = ""
             anomaly_detected = False
             anomaly_images = []
-            # Set this variable to test a different image directory
-            IMAGE_DIR = "/Users/ora/Documents/NASA-internship/template_michael/LunarAgent/test_cases/images/"  # Change this path to test other directories
             if image_monitoring_trigger:
-                if os.path.exists(IMAGE_DIR):
-                    for filename in os.listdir(IMAGE_DIR)[:10]:
-                        if filename.endswith('.jpg'):
-                            image_path = os.path.join(IMAGE_DIR, filename)
-                            image_bgr = cv2.imread(image_path)
-                            mask, segmented_image, has_plant = segment_plant_by_green(image_bgr)
-                            if has_plant:
-                                # Green detection (unchanged)
-                                green_pixels = np.sum((segmented_image[:,:,1] > 120) & (segmented_image[:,:,1] > segmented_image[:,:,0]) & (segmented_image[:,:,1] > segmented_image[:,:,2]) & (mask > 0))
-                                # Improved yellow detection using HSV, applied only to plant pixels
-                                hsv_img = cv2.cvtColor(segmented_image, cv2.COLOR_BGR2HSV)
-                                # Wider HSV yellow range: H 15-45, S 60-255, V 80-255
-                                lower_yellow = np.array([15, 60, 80])
-                                upper_yellow = np.array([45, 255, 255])
-                                yellow_mask = cv2.inRange(hsv_img, lower_yellow, upper_yellow)
-                                # Only count yellow pixels within plant mask
-                                yellow_pixels = np.sum((yellow_mask > 0) & (mask > 0))
-                                total_pixels = np.sum(mask > 0)
-                                green_ratio = green_pixels / total_pixels if total_pixels > 0 else 0
-                                yellow_ratio = yellow_pixels / total_pixels if total_pixels > 0 else 0
-                                color_report += f"{filename}: Green ratio={green_ratio:.2f}, Yellow ratio={yellow_ratio:.2f}\n"
-                                if green_ratio < 0.45 and yellow_ratio > 0.5:
-                                    anomaly_detected = True
-                                    anomaly_images.append(filename)
-
-            agent_input = f"user_input: {user_input}, act and make decisions based on these thresholds: {thresholds}"
-            agent_response = asyncio.run(self._async_chat(agent_input))
+                image_paths = _list_images(IMAGE_DIR, MAX_MONITORED_IMAGES) if IMAGE_DIR else []
+                if image_paths and _control_image_available():
+                    # OpenCV releases the GIL, so images are decoded and analyzed in parallel;
+                    # results are aggregated here on the calling thread.
+                    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+                        results = list(pool.map(_analyze_image, image_paths))
+                    for result in results:
+                        if result is None:
+                            continue
+                        filename, green_ratio, yellow_ratio, is_anomaly, report_line = result
+                        color_report += report_line
+                        if is_anomaly:
+                            anomaly_detected = True
+                            anomaly_images.append(filename)
+
+            agent_input = "user_input: " + user_input + THRESHOLDS_SUFFIX
+            agent_response = self._run(self._async_chat(agent_input))
 
             if image_monitoring_trigger:
                 if anomaly_detected:
@@ -461,9 +676,13 @@ if __name__ == "__main__":
         print("🔄 Thinking...")
         response = agent.chat(user_input)
         print("🌕🤖 LunarAgent: ", end="", flush=True)
-        for line in response.splitlines():
-            for word in line.split():
-                print(word, end=" ", flush=True)
-                time.sleep(0.05)
-            print()  # Newline after each line
+        # Typewriter effect is opt-in (LUNAR_TYPEWRITER=1) and only on a terminal;
+        # otherwise the reply is printed at once instead of sleeping per word.
+        if sys.stdout.isatty() and os.getenv("LUNAR_TYPEWRITER") == "1":
+            for line in response.splitlines():
+                sys.stdout.write(" ".join(line.split()) + "\n")
+                sys.stdout.flush()  # One write and flush per line
+                time.sleep(0.005 * len(line.split()))
+        else:
+            print(response)
         print("\n\n")  # Add extra space before next 'You:'
\ No newline at end of file
@@ -1,11 +1,12 @@
 import logging
-from detector import detect  # Single detect function handles all
-from all_sensors import merged_sensor_data
+from detector import detect, detect_batch  # Single detect function handles all
+import all_sensors
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
 def classify(data: dict):
     sensor = data.get("sensor", "").lower()
+    merged_sensor_data = all_sensors.merged_sensor_data
 
     if sensor in merged_sensor_data:
         # Add parameter to data for threshold detection
@@ -14,3 +15,13 @@ def classify(data: dict):
         detect(data)  # 🧠 Route to detector
     else:
         logging.warning(f"⚠️ Unknown sensor type: {sensor}")
+
+def classify_batch(sensor: str, values: list, timestamps: list):
+    """Routes a run of samples from one sensor to the vectorized detector path."""
+    sensor = sensor.lower()
+    sensor_info = all_sensors.merged_sensor_data.get(sensor)
+
+    if sensor_info is not None:
+        detect_batch(sensor, sensor_info["parameter"], sensor_info["unit"], values, timestamps)
+    else:
+        logging.warning(f"⚠️ Unknown sensor type: {sensor}")
@@ -1,16 +1,51 @@
+import asyncio
 import logging
-from collections import defaultdict
-from statistics import mean, stdev
+import sys
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from math import sqrt
 from datetime import datetime
-from environmental_thresholds import get_threshold  # Import the threshold function
+from typing import Callable, Optional
+import numpy as np
+from environmental_thresholds import get_threshold_flat  # Import the threshold function
 
 # Configure logging to be less verbose. This is the main change.
 # Warnings and errors will still appear, but informational messages will not fill up the console.
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-SENSOR_HISTORY = defaultdict(list)
-ANOMALY_LOG = []
+HISTORY_WINDOW = 512  # Samples kept per sensor; the z-score uses this rolling window
+Z_SCORE_CHUNK = 4096  # Batch samples scored per step; bounds the window copies to ~16 MB
+
+@dataclass(slots=True)
+class SensorState:
+    """Everything the detector tracks for one sensor, reached with a single dict lookup."""
+    history: deque = field(default_factory=lambda: deque(maxlen=HISTORY_WINDOW))
+    # Welford statistics over the history window
+    n: int = 0
+    mean: float = 0.0
+    m2: float = 0.0  # sum of squared deviations
+    # (optimal_min, optimal_max, extreme_min, extreme_max), resolved on first sample
+    limits: Optional[tuple] = None
+    # Specialized per-sample detector, built on first sample
+    detect_sample: Optional[Callable] = None
+
+SENSORS = {}
+
+def _sensor_state(sensor):
+    state = SENSORS.get(sensor)
+    if state is None:
+        state = SENSORS[sensor] = SensorState()
+    return state
+
+# Pending anomalies for the decision loop. Bounded so a stalled consumer can't grow it
+# without limit; ANOMALY_COUNTS keeps per-type totals that survive eviction.
+ANOMALY_LOG_MAXLEN = 10_000
+ANOMALY_LOG = deque(maxlen=ANOMALY_LOG_MAXLEN)
+ANOMALY_COUNTS = Counter()
+# Set whenever an anomaly is recorded so consumers can await new entries instead of polling
+ANOMALY_EVENT = asyncio.Event()
 THRESHOLD_Z = 3.5  # More stringent Z-score threshold
 MIN_HISTORY = 20   # Minimum history to start Z-score calculation (Optional for streaming)
 THRESHOLD_RATE = 0.5  # Rate of change threshold for trend analysis
@@ -24,99 +59,254 @@ def calculate_rate_of_change(sensor_data):
     rate_of_change = current_value - last_value
     return rate_of_change
 
+# Set by collect_anomalies() to divert new anomalies away from ANOMALY_LOG
+_anomaly_sink = None
+
+def _record_anomaly(anomaly):
+    (ANOMALY_LOG if _anomaly_sink is None else _anomaly_sink).append(anomaly)
+    ANOMALY_COUNTS[anomaly["threshold_type"]] += 1
+    ANOMALY_EVENT.set()
+
+@contextmanager
+def collect_anomalies():
+    """
+    Gathers the anomalies recorded inside the block into a list instead of ANOMALY_LOG,
+    so the caller can reorder them before they reach the bounded log.
+    ANOMALY_COUNTS and ANOMALY_EVENT are still updated as usual.
+    """
+    global _anomaly_sink
+    collected = []
+    _anomaly_sink = collected
+    try:
+        yield collected
+    finally:
+        _anomaly_sink = None
+
+# Only a handful of distinct parameter names stream in, so normalize each raw spelling once
+# and hand back one interned canonical string for every later occurrence
+_PARAM_CANON: dict[str, str] = {}
+
+def _normalize_parameter(parameter):
+    canon = _PARAM_CANON.get(parameter)
+    if canon is None:
+        canon = _PARAM_CANON.setdefault(parameter, sys.intern(parameter.strip().title()))
+    return canon
+
+# Welford update: add a sample to / remove an evicted sample from a sensor's statistics
+def _stats_add(state, value):
+    n = state.n + 1
+    delta = value - state.mean
+    mu = state.mean + delta / n
+    state.n, state.mean, state.m2 = n, mu, state.m2 + delta * (value - mu)
+
+def _stats_remove(state, value):
+    n = state.n - 1
+    if n == 0:
+        state.n, state.mean, state.m2 = 0, 0.0, 0.0
+        return
+    delta = value - state.mean
+    mu = state.mean - delta / n
+    state.n, state.mean, state.m2 = n, mu, max(state.m2 - delta * (value - mu), 0.0)
+
+# A sensor's parameter, unit and thresholds never change once it has been seen, so the
+# per-sample checks are specialized into a closure that only takes (value, timestamp).
+def _build_sensor_detector(sensor, state, parameter, unit):
+    # Normalize parameter for uniformity (capitalize each word and strip spaces)
+    parameter = _normalize_parameter(parameter)
+    values = state.history
+
+    def push(value):
+        # Append value to the history at the start of detection, keeping the
+        # window statistics in step with the ring buffer
+        if len(values) == HISTORY_WINDOW:
+            _stats_remove(state, values[0])
+        values.append(value)
+        _stats_add(state, value)
+
+        # Log current history length for debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Checking Z-score for sensor %s | Current data length: %d", sensor, len(values))
+
+    # Fetch parameter thresholds from environmental thresholds
+    limits = get_threshold_flat(parameter)
+    if limits is None:
+        def detect_sample(value, timestamp):
+            push(value)
+            logger.error("❌ No thresholds found for parameter: %s", parameter)
+        return detect_sample
+    state.limits = limits
+
+    def detect_sample(value, timestamp, optimal_min=limits[0], optimal_max=limits[1],
+                      extreme_min=limits[2], extreme_max=limits[3]):
+        push(value)
+
+        # Threshold-based anomaly detection
+        if value < extreme_min or value > extreme_max:
+            logger.info("Threshold Anomaly: %s for %s", "extreme", sensor)
+            _record_anomaly({
+                "sensor": sensor, "parameter": parameter, "unit": unit, "value": value,
+                "timestamp": timestamp, # Now appending the correct datetime object
+                "threshold_type": "extreme", "threshold": (extreme_min, extreme_max),
+            })
+        elif value < optimal_min or value > optimal_max:
+            logger.info("Threshold Anomaly: %s for %s", "optimal", sensor)
+            _record_anomaly({
+                "sensor": sensor, "parameter": parameter, "unit": unit, "value": value,
+                "timestamp": timestamp,
+                "threshold_type": "optimal", "threshold": (optimal_min, optimal_max),
+            })
+
+        # Calculate Z-score for each new value as data streams in.
+        # Mean and sample stdev come from the O(1) Welford window statistics instead of
+        # rescanning the history on every sample.
+        n, mu, m2 = state.n, state.mean, state.m2
+        if n >= MIN_HISTORY:
+            try:
+                sigma = sqrt(m2 / (n - 1))
+
+                if sigma != 0:
+                    z = (value - mu) / sigma
+                    if abs(z) > THRESHOLD_Z:
+                        z_anomaly = {
+                            "sensor": sensor, "parameter": parameter, "unit": unit, "value": value,
+                            "z_score": z, "timestamp": timestamp, "threshold_type": "z_score"
+                        }
+                        logger.info("Z-Score Anomaly for %s (z=%.2f)", sensor, z)
+                        _record_anomaly(z_anomaly)
+                else:
+                    logger.debug("Insufficient data (sigma == 0) for Z-score on %s", sensor)
+            except Exception as e:
+                logger.error("Error calculating Z-score for %s: %s", sensor, e)
+
+        # Trend-based detection for anomaly (rate of change detection)
+        rate_of_change = calculate_rate_of_change(values)
+        if abs(rate_of_change) > THRESHOLD_RATE:
+            trend_anomaly = {
+                "sensor": sensor, "parameter": parameter, "unit": unit, "value": value,
+                "rate_of_change": rate_of_change, "timestamp": timestamp, "threshold_type": "trend"
+            }
+            logger.info("Trend Anomaly for %s", sensor)
+            _record_anomaly(trend_anomaly)
+
+    return detect_sample
+
 # Detect anomalies
 def detect(data: dict):
     sensor = data.get("sensor")
     value = data.get("value")
-    timestamp_str = data.get("timestamp") # The timestamp arrives as a string
+    timestamp = data.get("timestamp") # A datetime from the streamer, or an ISO string
     parameter = data.get("parameter")
-    unit = data.get("unit")
 
     if sensor is None or value is None or parameter is None:
         return
 
     # --- THIS IS THE CRITICAL FIX ---
-    # Convert the timestamp string from the streamer back into a datetime object.
-    # This ensures that a proper datetime object is stored in the ANOMALY_LOG.
-    try:
-        timestamp = datetime.fromisoformat(timestamp_str)
-    except (ValueError, TypeError):
-        logger.warning(f"Could not parse timestamp string from streamer: {timestamp_str}")
-        return
+    # A proper datetime object must be stored in the ANOMALY_LOG. The streamer passes
+    # datetimes straight through; other callers may still send ISO strings.
+    if not isinstance(timestamp, datetime):
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except (ValueError, TypeError):
+            logger.warning("Could not parse timestamp string from streamer: %s", timestamp)
+            return
     # ---------------------------------
 
-    # Append value to SENSOR_HISTORY at the start of detection
-    SENSOR_HISTORY[sensor].append(value)
+    state = _sensor_state(sensor)
+    if state.detect_sample is None:
+        state.detect_sample = _build_sensor_detector(sensor, state, parameter, data.get("unit"))
+    state.detect_sample(value, timestamp)
 
-    # Log current history length for debugging
-    logger.debug(f"Checking Z-score for sensor {sensor} | Current data length: {len(SENSOR_HISTORY[sensor])}")
 
-    # Normalize parameter for uniformity (capitalize each word and strip spaces)
-    parameter = parameter.strip().title()
-
-    # Fetch parameter thresholds from environmental thresholds
-    thresholds = get_threshold(parameter)
-    if thresholds is None:
-        logger.error(f"❌ No thresholds found for parameter: {parameter}")
+# Detect anomalies for a run of samples from one sensor at once.
+# Equivalent to calling detect() on each sample in order, but the threshold, z-score
+# and trend checks are evaluated as NumPy array operations over the whole run.
+def detect_batch(sensor, parameter, unit, values, timestamps):
+    if sensor is None or parameter is None:
         return
 
-    # Unpack thresholds
-    optimal_min, optimal_max = thresholds['optimal']
-    extreme_min, extreme_max = thresholds['extreme']
-
-    anomaly_detected = False
-    anomaly_details = {}
-
-    # Threshold-based anomaly detection
-    if value < extreme_min or value > extreme_max:
-        anomaly_detected = True
-        anomaly_details = {
-            "threshold_type": "extreme",
-            "threshold": (extreme_min, extreme_max),
-        }
-    elif value < optimal_min or value > optimal_max:
-        anomaly_detected = True
-        anomaly_details = {
-            "threshold_type": "optimal",
-            "threshold": (optimal_min, optimal_max),
-        }
-
-    if anomaly_detected:
-        anomaly = {
-            "sensor": sensor, "parameter": parameter, "unit": unit, "value": value,
-            "timestamp": timestamp, # Now appending the correct datetime object
-            **anomaly_details
-        }
-        logger.info(f"Threshold Anomaly: {anomaly_details['threshold_type']} for {sensor}")
-        ANOMALY_LOG.append(anomaly)
-
-    # Calculate Z-score for each new value as data streams in
-    values = SENSOR_HISTORY[sensor]
-    if len(values) >= MIN_HISTORY:
+    samples = []
+    for value, timestamp in zip(values, timestamps):
+        if value is None:
+            continue
+        if isinstance(timestamp, datetime):
+            samples.append((value, timestamp))
+            continue
         try:
-            mu = mean(values)
-            sigma = stdev(values)
-
-            if sigma != 0:
-                z = (value - mu) / sigma
-                if abs(z) > THRESHOLD_Z:
-                    z_anomaly = {
-                        "sensor": sensor, "parameter": parameter, "unit": unit, "value": value,
-                        "z_score": round(z, 2), "timestamp": timestamp, "threshold_type": "z_score"
-                    }
-                    logger.info(f"Z-Score Anomaly for {sensor}")
-                    ANOMALY_LOG.append(z_anomaly)
-            else:
-                logger.debug(f"Insufficient data (sigma == 0) for Z-score on {sensor}")
-        except Exception as e:
-            logger.error(f"Error calculating Z-score for {sensor}: {e}")
-
-    # Trend-based detection for anomaly (rate of change detection)
-    rate_of_change = calculate_rate_of_change(values)
-    if abs(rate_of_change) > THRESHOLD_RATE:
-        trend_anomaly = {
-            "sensor": sensor, "parameter": parameter, "unit": unit, "value": value,
-            "rate_of_change": rate_of_change, "timestamp": timestamp, "threshold_type": "trend"
-        }
-        logger.info(f"Trend Anomaly for {sensor}")
-        ANOMALY_LOG.append(trend_anomaly)
\ No newline at end of file
+            samples.append((value, datetime.fromisoformat(timestamp)))
+        except (ValueError, TypeError):
+            logger.warning("Could not parse timestamp string from streamer: %s", timestamp)
+    if not samples:
+        return
+    values = [value for value, _ in samples]
+
+    # Window contents before this batch, followed by the batch itself
+    state = _sensor_state(sensor)
+    history = state.history
+    prior = len(history)
+    last_prior = history[-1] if prior else None
+    full = np.fromiter(history, dtype=np.float64, count=prior)
+    full = np.concatenate((full, np.asarray(values, dtype=np.float64)))
+    history.extend(values)
+    window = np.asarray(history, dtype=np.float64)
+    mu = float(window.mean())
+    state.n, state.mean, state.m2 = len(window), mu, float(((window - mu) ** 2).sum())
+
+    parameter = _normalize_parameter(parameter)
+    limits = state.limits
+    if limits is None:
+        limits = get_threshold_flat(parameter)
+        if limits is None:
+            logger.error("❌ No thresholds found for parameter: %s (%d samples)", parameter, len(samples))
+            return
+        state.limits = limits
+    optimal_min, optimal_max, extreme_min, extreme_max = limits
+
+    batch = full[prior:]
+    extreme = (batch < extreme_min) | (batch > extreme_max)
+    optimal = ~extreme & ((batch < optimal_min) | (batch > optimal_max))
+
+    # Rolling window ending at each batch sample (shorter while the history fills up)
+    padded = np.concatenate((np.full(HISTORY_WINDOW - 1, np.nan), full))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, HISTORY_WINDOW)[prior:]
+    z = np.zeros(len(batch))
+    # The view is free, but scoring copies its rows, so go Z_SCORE_CHUNK samples at a time
+    for start in range(0, len(batch), Z_SCORE_CHUNK):
+        chunk = windows[start:start + Z_SCORE_CHUNK]
+        counts = np.count_nonzero(~np.isnan(chunk), axis=1)
+        scored = counts >= MIN_HISTORY
+        if not scored.any():
+            continue
+        w = chunk[scored]
+        w_mu = np.nanmean(w, axis=1)
+        sigma = np.sqrt(np.nansum((w - w_mu[:, None]) ** 2, axis=1) / (counts[scored] - 1))
+        x = batch[start:start + Z_SCORE_CHUNK][scored]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z[start:start + Z_SCORE_CHUNK][scored] = np.where(sigma != 0, (x - w_mu) / sigma, 0.0)
+    z_flag = np.abs(z) > THRESHOLD_Z
+
+    previous = full[prior - 1:-1] if prior else np.concatenate(([batch[0]], batch[:-1]))
+    trend = np.abs(batch - previous) > THRESHOLD_RATE
+
+    for i in np.flatnonzero(extreme | optimal | z_flag | trend).tolist():
+        value, timestamp = samples[i]
+        if extreme[i] or optimal[i]:
+            threshold_type = "extreme" if extreme[i] else "optimal"
+            threshold = (extreme_min, extreme_max) if extreme[i] else (optimal_min, optimal_max)
+            logger.info("Threshold Anomaly: %s for %s", threshold_type, sensor)
+            _record_anomaly({
+                "sensor": sensor, "parameter": parameter, "unit": unit, "value": value,
+                "timestamp": timestamp, "threshold_type": threshold_type, "threshold": threshold,
+            })
+        if z_flag[i]:
+            logger.info("Z-Score Anomaly for %s (z=%.2f)", sensor, z[i])
+            _record_anomaly({
+                "sensor": sensor, "parameter": parameter, "unit": unit, "value": value,
+                "z_score": float(z[i]), "timestamp": timestamp, "threshold_type": "z_score"
+            })
+        if trend[i]:
+            last_value = values[i - 1] if i else last_prior
+            logger.info("Trend Anomaly for %s", sensor)
+            _record_anomaly({
+                "sensor": sensor, "parameter": parameter, "unit": unit, "value": value,
+                "rate_of_change": value - last_value, "timestamp": timestamp, "threshold_type": "trend"
+            })
@@ -1,4 +1,5 @@
 # environmental_thresholds.py
+from functools import lru_cache
 
 # Define the environmental thresholds for C3 plants, including updated Valve ranges
 thresholds = {
@@ -26,12 +27,22 @@ perturbation_thresholds = {
     "humidity_swing": 10,  # % change in humidity in 30 minutes
 }
 
-# Function to get the environmental thresholds for a specific parameter
+# Threshold keys normalized the same way detector normalizes incoming parameter names
+_NORMALIZED_THRESHOLDS = {name.strip().title(): limits for name, limits in thresholds.items()}
+
+# Function to get the environmental thresholds for a specific parameter.
+# Only a handful of parameter names ever occur, so lookups are memoized.
+@lru_cache(maxsize=64)
 def get_threshold(parameter):
-    if parameter in thresholds:
-        return thresholds[parameter]
-    else:
-        return None  # Return None if parameter is not found
+    return _NORMALIZED_THRESHOLDS.get(parameter.strip().title())  # None if parameter is not found
+
+# Same limits flattened to (optimal_min, optimal_max, extreme_min, extreme_max) for
+# per-sample comparisons without nested dict/tuple access
+_FLAT_THRESHOLDS = {name: (*limits['optimal'], *limits['extreme']) for name, limits in _NORMALIZED_THRESHOLDS.items()}
+
+@lru_cache(maxsize=64)
+def get_threshold_flat(parameter):
+    return _FLAT_THRESHOLDS.get(parameter.strip().title())  # None if parameter is not found
 
 # Example usage (only runs when this file is executed directly)
 if __name__ == "__main__":
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Shared LLM client for the Lunar Agriculture Pod agents.
+Callers on the same event loop asking for the same model/temperature get the same
+ChatOpenAI instance, and all instances on that loop share one pooled HTTP client.
+"""
+import asyncio
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+# Per event loop: its pooled HTTP client and the ChatOpenAI instances built on it.
+# An httpx.AsyncClient must only be used from the loop it was first used on, so
+# nothing is shared across loops; entries for closed loops are dropped on lookup.
+_PER_LOOP = {}
+
+
+def _loop_state():
+    loop = asyncio.get_running_loop()
+    for stale in [l for l in _PER_LOOP if l.is_closed()]:
+        del _PER_LOOP[stale]
+    state = _PER_LOOP.get(loop)
+    if state is None:
+        # Keep-alive pool reused across agent turns so replies don't pay a new TLS handshake.
+        client = httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=20))
+        state = _PER_LOOP[loop] = (client, {})
+    return state
+
+
+def get_llm(model: str = "gpt-4o", temperature: float = 0) -> ChatOpenAI:
+    """
+    Returns the ChatOpenAI shared by callers on the running event loop. Must be called
+    from a coroutine on the loop that will await the model.
+    """
+    client, llms = _loop_state()
+    llm = llms.get((model, temperature))
+    if llm is None:
+        llm = llms[(model, temperature)] = ChatOpenAI(
+            model=model, temperature=temperature, http_async_client=client
+        )
+    return llm
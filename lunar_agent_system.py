@@ -4,21 +4,64 @@ Integrated Lunar Agriculture Pod Agent System (Immediate Decision Mode)
 This version contains the final, definitive logic for parsing and displaying decisions correctly.
 """
 import asyncio
+import atexit
 import logging
 import os
 import re
 from datetime import datetime
 
+import orjson
 from dotenv import load_dotenv
 
 from autonomous_decision_agent import AutonomousDecisionAgent
-from detector import ANOMALY_LOG
+from detector import ANOMALY_EVENT, ANOMALY_LOG
 from streamer import stream_all_events_to_classifier
 
 load_dotenv()
 logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+# Section patterns for the decision text, compiled once
+URGENCY_RE = re.compile(r"URGENCY:\s*(.*?)\n", re.IGNORECASE)
+# Stops at the "IMMEDIATE_ACTIONS" header, preventing the duplication.
+REASONING_RE = re.compile(r"REASONING:\s*(.*?)(?=\n\d*\.?\s*IMMEDIATE_ACTIONS:|\Z)", re.IGNORECASE | re.DOTALL)
+# Finds the "IMMEDIATE_ACTIONS" section, even if it's numbered.
+IMMEDIATE_ACTIONS_RE = re.compile(r"IMMEDIATE_ACTIONS:\s*\n(.*?)$", re.IGNORECASE | re.DOTALL)
+
+def _split_decision_sections(raw_output: str):
+    """Returns the raw (urgency, reasoning, actions) section texts, or None for a missing section."""
+    sections = []
+    for pattern in (URGENCY_RE, REASONING_RE, IMMEDIATE_ACTIONS_RE):
+        match = pattern.search(raw_output)
+        sections.append(match.group(1) if match else None)
+    return tuple(sections)
+
+# Known subsystem commands, in the order they are executed when found in the LLM output
+ACTION_KEYWORDS = (
+    "trigger_alarm", "notify_team", "activate_water_dispenser", "deactivate_water_dispenser",
+    "log_status", "run_metagenomics_analysis", "increase_fan_speed", "decrease_fan_speed",
+    "activate_electrical_heaters", "deactivate_electrical_heaters", "activate_cooling_system", "deactivate_cooling_system", "open_air_exchange",
+    "close_air_exchange", "activate_CO2_scrubber", "deactivate_CO2_scrubber",
+    "adjust_photoperiod", "increase_light_intensity", "decrease_light_intensity", "increase_nitrogen_level", "decrease_nitrogen_level", "flush_nutrient_line",
+    "dispense_ph_up", "run_rnaseq_analysis", "schedule_retest"
+)
+# The commands are plain literals, so a case-insensitive search is a substring test
+# against the lowercased output
+_ACTION_KEYWORDS_LOWER = tuple(cmd.lower() for cmd in ACTION_KEYWORDS)
+
+# Sensor-name fragments that evaluate_stabilization checks readings against
+STABILIZATION_KINDS = ("rh_percent", "temp_degc", "co2_ppm")
+# (active control, reading kind, reading is back in range, command to run then), checked in order
+STABILIZATION_RULES = (
+    ("activate_water_dispenser", "rh_percent", lambda v: 45 <= v <= 70, "deactivate_water_dispenser"),
+    ("deactivate_water_dispenser", "rh_percent", lambda v: v > 70, "activate_water_dispenser"),
+    ("activate_electrical_heaters", "temp_degc", lambda v: 18 <= v <= 27, "deactivate_electrical_heaters"),
+    ("activate_cooling_system", "temp_degc", lambda v: 18 <= v <= 27, "deactivate_cooling_system"),
+    ("open_air_exchange", "co2_ppm", lambda v: 300 <= v <= 1000, "close_air_exchange"),
+    ("activate_CO2_scrubber", "co2_ppm", lambda v: 300 <= v <= 1000, "deactivate_CO2_scrubber"),
+    ("increase_fan_speed", "co2_ppm", lambda v: 300 <= v <= 1000, "decrease_fan_speed"),
+)
+
 class LunarAgentSystem:
     def execute_action(self, cmd: str):
         print(f"[EXECUTING ACTION] {cmd}")
@@ -57,6 +100,7 @@ class LunarAgentSystem:
         self.anomaly_trigger_threshold = 1
         self.decision_agent = AutonomousDecisionAgent()
         self.active_controls = set()
+        self._decision_log = None
 
 
     def _parse_and_print_decision(self, raw_output: str, anomalies: list):
@@ -67,7 +111,7 @@ class LunarAgentSystem:
         print("\n  ANOMALIES IN THIS CYCLE:")
         for anomaly in anomalies[:5]: # Print up to 5 for brevity
              ts_obj = anomaly.get('timestamp')
-             ts = ts_obj.strftime('%H:%M:%S') if isinstance(ts_obj, datetime) else "N/A"
+             ts = f"{ts_obj:%H:%M:%S}" if isinstance(ts_obj, datetime) else "N/A"
              sensor = anomaly.get('sensor')
              value = anomaly.get('value')
              atype = anomaly.get('threshold_type')
@@ -78,22 +122,17 @@ class LunarAgentSystem:
         # --- THIS IS THE FINAL, DEFINITIVE PARSING LOGIC ---
         urgency, reasoning, actions = "UNKNOWN", "No reasoning provided.", []
 
-        # Use more specific, non-greedy regex to find each section independently.
-        # This handles the reordered output correctly.
-        urgency_match = re.search(r"URGENCY:\s*(.*?)\n", raw_output, re.IGNORECASE)
-        # This regex stops at the "IMMEDIATE_ACTIONS" header, preventing the duplication.
-        reasoning_match = re.search(r"REASONING:\s*(.*?)(?=\n\d*\.?\s*IMMEDIATE_ACTIONS:|\Z)", raw_output, re.IGNORECASE | re.DOTALL)
-        # This regex specifically finds the "IMMEDIATE_ACTIONS" section, even if it's numbered.
-        actions_match = re.search(r"IMMEDIATE_ACTIONS:\s*\n(.*?)$", raw_output, re.IGNORECASE | re.DOTALL)
+        # Find each section independently, so reordered output is handled correctly.
+        urgency_text, reasoning_text, actions_text = _split_decision_sections(raw_output)
 
-        if urgency_match:
-            urgency = urgency_match.group(1).strip().replace('*', '')
+        if urgency_text is not None:
+            urgency = urgency_text.strip().replace('*', '')
         
-        if reasoning_match:
-            reasoning = reasoning_match.group(1).strip().replace('*', '')
+        if reasoning_text is not None:
+            reasoning = reasoning_text.strip().replace('*', '')
         
-        if actions_match:
-            actions_text = actions_match.group(1).strip()
+        if actions_text is not None:
+            actions_text = actions_text.strip()
             # This ensures we only capture lines that are formatted as actions.
             actions = [line.strip() for line in actions_text.split('\n') if "Action:" in line]
         
@@ -106,21 +145,9 @@ class LunarAgentSystem:
         print("\n  IMMEDIATE ACTIONS:")
         # Scan the entire LLM output for known subsystem commands
         all_output = f"{reasoning}\n{raw_output}"
-        action_keywords = [
-            "trigger_alarm", "notify_team", "activate_water_dispenser", "deactivate_water_dispenser",
-            "log_status", "run_metagenomics_analysis", "increase_fan_speed", "decrease_fan_speed",
-            "activate_electrical_heaters", "deactivate_electrical_heaters", "activate_cooling_system", "deactivate_cooling_system", "open_air_exchange", 
-            "close_air_exchange", "activate_CO2_scrubber", "deactivate_CO2_scrubber",
-            "adjust_photoperiod", "increase_light_intensity", "decrease_light_intensity", "increase_nitrogen_level", "decrease_nitrogen_level", "flush_nutrient_line",
-            "dispense_ph_up", "run_rnaseq_analysis", "schedule_retest"
-        ]    
-
-        executed_actions = []
-        for cmd in action_keywords:
-            if re.search(rf"`?{re.escape(cmd)}`?", all_output, re.IGNORECASE):
-                executed_actions.append(cmd)
+        lowered = all_output.lower()
+        executed_actions = [cmd for cmd, low in zip(ACTION_KEYWORDS, _ACTION_KEYWORDS_LOWER) if low in lowered]
 
-        
         if executed_actions:
             for cmd in executed_actions:
                 print(f"[SYSTEM] Executing: {cmd}")
@@ -133,54 +160,48 @@ class LunarAgentSystem:
         sensors = {a['sensor']: a['value'] for a in anomalies}
         actions_to_deactivate = []
 
-        value = next((v for k, v in sensors.items() if "rh_percent" in k), None)
-        if "activate_water_dispenser" in self.active_controls and value and 45 <= value <= 70:
-            actions_to_deactivate.append("deactivate_water_dispenser")
-            self.active_controls.remove("activate_water_dispenser")
-            
-        value = next((v for k, v in sensors.items() if "rh_percent" in k), None)
-        if "deactivate_water_dispenser" in self.active_controls and value and value > 70:
-            actions_to_deactivate.append("activate_water_dispenser")
-            self.active_controls.remove("deactivate_water_dispenser")
-
-        value = next((v for k, v in sensors.items() if "temp_degc" in k), None)
-        if "activate_electrical_heaters" in self.active_controls and value and 18 <= value <= 27:
-            actions_to_deactivate.append("deactivate_electrical_heaters")
-            self.active_controls.remove("activate_electrical_heaters")
-
-        value = next((v for k, v in sensors.items() if "temp_degc" in k), None)
-        if "activate_cooling_system" in self.active_controls and value and 18 <= value <= 27:
-            actions_to_deactivate.append("deactivate_cooling_system")
-            self.active_controls.remove("activate_cooling_system")
-
-        value = next((v for k, v in sensors.items() if "co2_ppm" in k), None)
-        if "open_air_exchange" in self.active_controls and value and 300 <= value <= 1000:
-            actions_to_deactivate.append("close_air_exchange")
-            self.active_controls.remove("open_air_exchange")
-
-        value = next((v for k, v in sensors.items() if "co2_ppm" in k), None)
-        if "activate_CO2_scrubber" in self.active_controls and value and 300 <= value <= 1000:
-            actions_to_deactivate.append("deactivate_CO2_scrubber")
-            self.active_controls.remove("activate_CO2_scrubber")
-            
-        value = next((v for k, v in sensors.items() if "co2_ppm" in k), None)
-        if "increase_fan_speed" in self.active_controls and value and 300 <= value <= 1000:
-            actions_to_deactivate.append("decerease_fan_speed")
-            self.active_controls.remove("increase_fan_speed")
+        # One pass over the sensors: first value seen for each kind of reading
+        by_kind = {}
+        for k, v in sensors.items():
+            for kind in STABILIZATION_KINDS:
+                if kind in k:
+                    by_kind.setdefault(kind, v)
+
+        for active, kind, settled, follow_up in STABILIZATION_RULES:
+            value = by_kind.get(kind)
+            if active in self.active_controls and value and settled(value):
+                actions_to_deactivate.append(follow_up)
+                self.active_controls.remove(active)
 
         for cmd in actions_to_deactivate:
             print(f"[SYSTEM] Auto-deactivating: {cmd}")
             self.execute_action(cmd)
 
 
+    def _save_decision(self, decision_result):
+        os.makedirs('data', exist_ok=True)
+
+        # Save latest decision
+        with open('data/last_decision.json', 'wb') as f:
+            f.write(orjson.dumps(decision_result, option=orjson.OPT_INDENT_2))
+
+        # Append to decision log, keeping the file open across cycles
+        if self._decision_log is None:
+            self._decision_log = open('data/decision_log.jsonl', 'ab', buffering=1 << 16)
+            atexit.register(self._decision_log.close)
+        self._decision_log.write(orjson.dumps(decision_result) + b"\n")
+        self._decision_log.flush()
+
     async def _check_decision_trigger_loop(self):
         """Continuously checks for anomalies and triggers the decision agent."""
         await asyncio.sleep(10)
         print("--- Autonomous Decision Agent is now active (Immediate Decision Mode). ---")
 
         while True:
-            await asyncio.sleep(0.1)
-            
+            # Woken by the detector as soon as an anomaly is recorded
+            await ANOMALY_EVENT.wait()
+            ANOMALY_EVENT.clear()
+
             if len(ANOMALY_LOG) >= self.anomaly_trigger_threshold:
                 anomalies_for_this_cycle = list(ANOMALY_LOG)
                 ANOMALY_LOG.clear()
@@ -191,17 +212,8 @@ class LunarAgentSystem:
                 
                 decision_result = await self.decision_agent.run_autonomous_cycle(anomalies_for_this_cycle)
                 
-                import os, json
-                os.makedirs('data', exist_ok=True)
+                self._save_decision(decision_result)
 
-                # Save latest decision
-                with open('data/last_decision.json', 'w') as f:
-                    json.dump(decision_result, f, indent=2)
-
-                # Append to decision log
-                with open('data/decision_log.jsonl', 'a') as f:
-                    f.write(json.dumps(decision_result) + '\\n')
-                
                 self._parse_and_print_decision(decision_result.get("raw_output", ""), anomalies_for_this_cycle)
                 
                 self.evaluate_stabilization(anomalies_for_this_cycle)
@@ -3,30 +3,39 @@
 import cv2
 import numpy as np
 import os
+from functools import lru_cache
 
-def segment_plant_by_green(image_bgr, lG = 4, uG = 70, green_threshold=5000):
+# Use a relative path for the control image so the code works for any user
+CONTROL_IMG_PATH = os.path.join(os.path.dirname(__file__), "data", "exolab_images", "imaging_lens_position_7.0_cam_0_1730496602.jpg")
+
+@lru_cache(maxsize=4)
+def _control_hsv(size):
     """
-    Segments green plant from background. Returns mask, segmented image,
-    and boolean flag whether a plant is present.
-    Parameters: lg: lower green hue threshold, default is 4,
-                ug: upper green hue threshold, default is 70,
-                image_bgr: input image in BGR format,
-                green_threshold: minimum number of green pixels to consider a plant present.
-    Returns: mask_clean_2: binary mask of the plant,
-             result_2: segmented image with plant,
-             has_plant: boolean flag indicating if a plant is detected.
+    Loads the blurred control image as HSV, resized to size (rows, cols) when the
+    images being analysed were decoded at a different resolution.
     """
-    # Use a relative path for the control image so the code works for any user
-    control_img_rel_path = os.path.join(os.path.dirname(__file__), "data", "exolab_images", "imaging_lens_position_7.0_cam_0_1730496602.jpg")
-    control_bgr = cv2.imread(control_img_rel_path)
+    control_bgr = cv2.imread(CONTROL_IMG_PATH)
     if control_bgr is None:
-        raise FileNotFoundError(f"Control image not found at {control_img_rel_path}. Please ensure the image exists.")
+        raise FileNotFoundError(f"Control image not found at {CONTROL_IMG_PATH}. Please ensure the image exists.")
+    if control_bgr.shape[:2] != size:
+        control_bgr = cv2.resize(control_bgr, (size[1], size[0]), interpolation=cv2.INTER_AREA)
     control_bgr = cv2.GaussianBlur(control_bgr, (3,3), 0)
+    return cv2.cvtColor(control_bgr, cv2.COLOR_BGR2HSV)
+
+# Yellow range (HSV) used when scoring plant color: H 15-45, S 60-255, V 80-255
+LOWER_YELLOW_HSV = (15, 60, 80)
+UPPER_YELLOW_HSV = (45, 255, 255)
+
+def _segment(image_bgr, lG, uG):
+    """
+    Shared segmentation steps. Returns the blurred BGR image, its HSV conversion,
+    the hue/saturation-difference mask and the cleaned green-range plant mask.
+    """
     image_bgr = cv2.GaussianBlur(image_bgr, (3,3), 0)
 
     # Convert to HSV
     image_hsv = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV)
-    control_hsv = cv2.cvtColor(control_bgr, cv2.COLOR_BGR2HSV)
+    control_hsv = _control_hsv(image_hsv.shape[:2])
 
     plant_diff = cv2.absdiff(image_hsv, control_hsv)
 
@@ -54,6 +63,22 @@ def segment_plant_by_green(image_bgr, lG = 4, uG = 70, green_threshold=5000):
     # Morphological cleaning_2
     mask_clean_2 = cv2.morphologyEx(mask_2, cv2.MORPH_OPEN, kernel, iterations=2)
 
+    return image_bgr, image_hsv, mask_clean, mask_clean_2
+
+def segment_plant_by_green(image_bgr, lG = 4, uG = 70, green_threshold=5000):
+    """
+    Segments green plant from background. Returns mask, segmented image,
+    and boolean flag whether a plant is present.
+    Parameters: lg: lower green hue threshold, default is 4,
+                ug: upper green hue threshold, default is 70,
+                image_bgr: input image in BGR format,
+                green_threshold: minimum number of green pixels to consider a plant present.
+    Returns: mask_clean_2: binary mask of the plant,
+             result_2: segmented image with plant,
+             has_plant: boolean flag indicating if a plant is detected.
+    """
+    image_bgr, _, mask_clean, mask_clean_2 = _segment(image_bgr, lG, uG)
+
     # Count green pixels
     green_pixels = cv2.countNonZero(mask_clean)
     has_plant = green_pixels > green_threshold  # auto-skip threshold
@@ -64,6 +89,41 @@ def segment_plant_by_green(image_bgr, lG = 4, uG = 70, green_threshold=5000):
 
     return mask_clean_2, result_2, has_plant
 
+def segment_and_classify(image_bgr, lG = 4, uG = 70, green_threshold=5000, min_bbox_area=0):
+    """
+    Segments the plant and counts its green and yellow pixels in one pass, reusing
+    the HSV image computed for segmentation instead of building a segmented copy
+    and converting it again.
+    Parameters: as segment_plant_by_green, plus
+                min_bbox_area: plant bounding boxes smaller than this are treated as no plant.
+    Returns: (green_pixels, yellow_pixels, total_pixels) counted inside the plant mask,
+             or None when no plant is detected.
+             green: G > 120 and G dominates B and R (BGR),
+             yellow: inside LOWER_YELLOW_HSV..UPPER_YELLOW_HSV.
+    """
+    image_bgr, image_hsv, mask_clean, mask = _segment(image_bgr, lG, uG)
+    if cv2.countNonZero(mask_clean) <= green_threshold:
+        return None
+
+    # Only plant pixels are scored, so work on the mask's bounding box
+    x, y, w, h = cv2.boundingRect(mask)
+    if w * h < min_bbox_area:
+        return None
+    mask = mask[y:y + h, x:x + w]
+    image_bgr = image_bgr[y:y + h, x:x + w]
+    image_hsv = image_hsv[y:y + h, x:x + w]
+
+    blue, green, red = cv2.split(image_bgr)
+    green_mask = cv2.compare(green, 120, cv2.CMP_GT)
+    cv2.bitwise_and(green_mask, cv2.compare(green, blue, cv2.CMP_GT), dst=green_mask)
+    cv2.bitwise_and(green_mask, cv2.compare(green, red, cv2.CMP_GT), dst=green_mask)
+    green_pixels = cv2.countNonZero(cv2.bitwise_and(green_mask, mask))
+
+    yellow_mask = cv2.inRange(image_hsv, LOWER_YELLOW_HSV, UPPER_YELLOW_HSV)
+    yellow_pixels = cv2.countNonZero(cv2.bitwise_and(yellow_mask, mask))
+
+    return green_pixels, yellow_pixels, cv2.countNonZero(mask)
+
 def find_plant_vert_height(mask_inp, genPlot = False):
   
   """Finds the vertical height of the plant in the image mask.
@@ -1,8 +1,16 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import NamedTuple
 
 class SensorData(BaseModel):
     timestamp: datetime
     sensor: str
     value: float
     source: str
+
+class SensorEvent(NamedTuple):
+    """Lightweight per-reading record used inside the streamer; same fields as SensorData."""
+    timestamp: datetime
+    sensor: str
+    value: float
+    source: str
@@ -1,21 +1,31 @@
 #!/usr/bin/env python3
+import io
 import os
 import sys
 import json
 import warnings
-import re
+import string
+import heapq
+from operator import itemgetter
+from datetime import datetime
 from pathlib import Path
 from dateutil import parser
 import polars as pl
 import asyncio
-from schemas import SensorData
-from classifier import classify
+from schemas import SensorEvent
+from classifier import classify, classify_batch
+from detector import ANOMALY_LOG, collect_anomalies
 
 warnings.filterwarnings("ignore")
 
 DATA_DIR = os.path.join(os.path.dirname(__file__) or ".", "data")
 DROP_COLUMNS = {"Mission_Milestone"}
-REALTIME_DELAY = 0.01  # seconds
+ISO_TIMESTAMP_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S")
+# Exact shape of the timestamps that may take the column-wise path. Polars' parser is
+# lenient (two-digit or zero years, a leading "+", second 60), so anything else is left to
+# the per-row parsers
+ISO_TIMESTAMP_PATTERN = r"^[1-9][0-9]{3}-[0-9]{2}-[0-9]{2}[ T](?:[01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9]$"
+REALTIME_DELAY = 0.01  # seconds; 0 replays the whole dataset unpaced through the batched detector
 
 def get_source(file_path):
     if "edeniss2020" in file_path.lower():
@@ -26,6 +36,22 @@ def get_source(file_path):
     parts = name.split("_")
     return "_".join(parts[:2]) if len(parts) > 2 and parts[-1].isdigit() else name
 
+_DROP_ASCII_LETTERS = str.maketrans("", "", string.ascii_letters)
+
+def _count_ascii_letters(line):
+    return len(line) - len(line.translate(_DROP_ASCII_LETTERS))
+
+def _full_sensor_name(source, subsystem, column):
+    clean_sensor = column.strip()
+    # Only the ".x"/".y" merge suffixes are dropped, not any trailing x/y/. characters
+    if clean_sensor.endswith((".x", ".y")):
+        clean_sensor = clean_sensor[:-2]
+    clean_sensor = clean_sensor.lower().replace(" ", "_")
+
+    if source == "edeniss2020" and subsystem:
+        return f"{source}-{subsystem}-{clean_sensor}"
+    return f"{source}-{clean_sensor}"
+
 def extract_events_from_file(file_path):
     events = []
     source = get_source(file_path)
@@ -34,24 +60,28 @@ def extract_events_from_file(file_path):
     else:
         subsystem = None
 
-    header_skip = 0
+    # Read the file once; header sniffing, the preview and the full scan all use these bytes
     try:
-        with open(file_path, 'r', errors='ignore') as f:
-            first, second = f.readline(), f.readline()
-            if second and len(re.findall(r"[A-Za-z]", first)) < len(re.findall(r"[A-Za-z]", second)):
-                header_skip = 1
+        with open(file_path, 'rb') as f:
+            buf = f.read()
     except Exception:
         return events
 
+    header_skip = 0
+    head = io.TextIOWrapper(io.BytesIO(buf), errors='ignore')
+    first, second = head.readline(), head.readline()
+    if second and _count_ascii_letters(first) < _count_ascii_letters(second):
+        header_skip = 1
+
     try:
         df_preview = pl.read_csv(
-            file_path, skip_rows=header_skip, n_rows=5,
+            buf, skip_rows=header_skip, n_rows=5,
             has_header=True, infer_schema_length=0, ignore_errors=True
         )
     except Exception:
         try:
             df_preview = pl.read_csv(
-                file_path, skip_rows=header_skip, n_rows=6,
+                buf, skip_rows=header_skip, n_rows=6,
                 has_header=False, ignore_errors=True
             )
             new_cols = [str(x) for x in df_preview.row(0)]
@@ -62,82 +92,125 @@ def extract_events_from_file(file_path):
 
     columns = df_preview.columns
     ts_col = next((c for c in columns if "time" in c.lower() or "date" in c.lower()), columns[0])
+    # Project away dropped columns by position so they are never parsed (works with or without a header row)
+    keep_cols = [i for i, c in enumerate(columns) if c not in DROP_COLUMNS]
 
-    offset = header_skip
-    batch_size = 10000
-    while True:
-        try:
-            df = pl.read_csv(
-                file_path, skip_rows=offset, n_rows=batch_size,
-                has_header=(offset == header_skip),
-                infer_schema_length=100, ignore_errors=True
-            )
-        except Exception:
-            break
-        if df.is_empty():
-            break
-        offset += df.height
-
-        for col in DROP_COLUMNS:
-            if col in df.columns:
-                df = df.drop(col)
-
-        if ts_col not in df.columns:
-            fallback_cols = [c for c in df.columns if "time" in c.lower() or "date" in c.lower()]
-            if fallback_cols:
-                ts_col = fallback_cols[0]
-            else:
-                continue
-
-        if df[ts_col].dtype != pl.Utf8:
-            df = df.with_columns(pl.col(ts_col).cast(pl.Utf8))
-
-        for row in df.iter_rows(named=True):
-            ts_val = row.get(ts_col)
-            if ts_val is None or str(ts_val).strip() == "":
-                continue
-            try:
-                dt = parser.parse(str(ts_val), dayfirst=False)
-            except Exception:
-                continue
-            ts_str = dt.strftime("%Y-%m-%dT%H:%M:%S")
-
-            for sensor, value in row.items():
-                if sensor == ts_col or value is None or (isinstance(value, str) and value.strip() == ""):
+    # Parse the file in one forward pass (the old skip_rows/n_rows loop re-read every
+    # earlier row per batch), then walk it in 10k-row slices
+    try:
+        df_all = (
+            pl.scan_csv(buf, skip_rows=header_skip, infer_schema_length=100, ignore_errors=True)
+            .select(pl.nth(keep_cols))
+            .collect(engine="streaming")
+        )
+    except Exception:
+        return events
+
+    # Every slice shares df_all's schema, so the column lookups are resolved once here
+    columns = df_all.columns
+    if ts_col not in columns:
+        fallback_cols = [c for c in columns if "time" in c.lower() or "date" in c.lower()]
+        if not fallback_cols:
+            return events
+        ts_col = fallback_cols[0]
+
+    if df_all[ts_col].dtype != pl.Utf8:
+        df_all = df_all.with_columns(pl.col(ts_col).cast(pl.Utf8))
+
+    # Numeric strings are cast column-wise. Polars only ever rejects more than
+    # Python does (padding, underscores, non-ASCII digits), so a null cast of a
+    # non-blank string falls back to int()/float() below.
+    ts_idx = columns.index(ts_col)
+    str_cols = [c for c, dtype in df_all.schema.items() if c != ts_col and dtype == pl.Utf8]
+    # Full sensor name per column; None marks the timestamp column
+    sensor_names = [None if c == ts_col else _full_sensor_name(source, subsystem, c) for c in columns]
+    ts = pl.col(ts_col)
+
+    for df in df_all.iter_slices(10000):
+        # Plain ISO timestamps are parsed column-wise; anything else (null here) still
+        # goes through the per-row parsers
+        iso_dt = df.select(
+            pl.when(ts.str.contains(ISO_TIMESTAMP_PATTERN)).then(pl.coalesce(
+                ts.str.to_datetime(fmt, strict=False, exact=True) for fmt in ISO_TIMESTAMP_FORMATS
+            ))
+        ).to_series()
+        cast_df = df.with_columns(pl.col(str_cols).cast(pl.Float64, strict=False))
+
+        for dt, raw_row, cast_row in zip(iso_dt, df.iter_rows(), cast_df.iter_rows()):
+            if dt is None:
+                # The timestamp column is cast to Utf8 above, so this is a str or None
+                ts_val = raw_row[ts_idx]
+                if not ts_val or ts_val.isspace():
                     continue
-                if isinstance(value, str):
+                try:
+                    # C fast path for the remaining ISO variants (fractions, offsets, Z)
+                    dt = datetime.fromisoformat(ts_val)
+                except ValueError:
                     try:
-                        value = int(value) if re.fullmatch(r"[-+]?\d+", value) else float(value)
+                        dt = parser.parse(ts_val, dayfirst=False)
                     except Exception:
                         continue
 
-                clean_sensor = sensor.strip().rstrip(".xy").lower().replace(" ", "_")
-
-                if source == "edeniss2020" and subsystem:
-                    full_sensor_name = f"{source}-{subsystem}-{clean_sensor}"
-                else:
-                    full_sensor_name = f"{source}-{clean_sensor}"
+            for full_sensor_name, raw, value in zip(sensor_names, raw_row, cast_row):
+                if full_sensor_name is None:
+                    continue
+                if value is None:
+                    if not isinstance(raw, str) or not raw or raw.isspace():
+                        continue
+                    try:
+                        value = int(raw) if raw.lstrip("+-").isdigit() else float(raw)
+                    except Exception:
+                        continue
 
+                # float() is the coercion SensorData validation used to do (int/bool cells)
                 try:
-                    obj = SensorData(
-                        timestamp=dt, # Keep as datetime for sorting
-                        sensor=full_sensor_name,
-                        value=value,
-                        source=source
-                    )
-                    events.append((dt, obj))
-                except Exception as e:
+                    value = float(value)
+                except (TypeError, ValueError, OverflowError) as e:
                     print(f"❌ Validation error: {e}", file=sys.stderr)
+                    continue
+                events.append((dt, SensorEvent(dt, full_sensor_name, value, source)))
     return events
 
+def _detector_timestamp(dt):
+    # The detector takes datetimes directly; keep the whole-second, naive wall-clock
+    # value it used to get back from the "%Y-%m-%dT%H:%M:%S" string round-trip.
+    return dt.replace(microsecond=0, tzinfo=None)
+
+def replay_events_batched(events):
+    """
+    Unpaced replay: groups the events by sensor and runs each group through the
+    vectorized detector, then restores chronological order in the anomaly log.
+    """
+    by_sensor = {}
+    for dt, sensor_obj in events:
+        values, timestamps = by_sensor.setdefault(sensor_obj.sensor, ([], []))
+        values.append(sensor_obj.value)
+        timestamps.append(_detector_timestamp(dt))
+    with collect_anomalies() as new_anomalies:
+        for sensor, (values, timestamps) in by_sensor.items():
+            classify_batch(sensor, values, timestamps)
+    # Groups are recorded one sensor at a time; sort before they reach the bounded log
+    # so it keeps the latest anomalies, as the paced path does
+    new_anomalies.sort(key=lambda a: a["timestamp"])
+    ANOMALY_LOG.extend(new_anomalies)
+
 async def stream_sorted_events(events):
-    events.sort(key=lambda x: x[0])
+    """Streams (datetime, SensorEvent) events, already in chronological order, to the classifier."""
+    if REALTIME_DELAY <= 0:
+        replay_events_batched(events)
+        return
+    # Pace against a running deadline so time spent classifying counts towards the
+    # delay, and skip sleeps shorter than the event loop can honour
+    loop = asyncio.get_running_loop()
+    deadline = loop.time()
     for _, sensor_obj in events:
-        data = sensor_obj.dict()
-        # Ensure timestamp is a string for the classifier/detector
-        data['timestamp'] = data['timestamp'].strftime("%Y-%m-%dT%H:%M:%S")
+        data = sensor_obj._asdict()
+        data['timestamp'] = _detector_timestamp(data['timestamp'])
         classify(data)
-        await asyncio.sleep(REALTIME_DELAY)
+        deadline += REALTIME_DELAY
+        delay = deadline - loop.time()
+        if delay > 0.001:
+            await asyncio.sleep(delay)
 
 # NEW function that can be imported by other scripts
 async def stream_all_events_to_classifier(data_dir: str):
@@ -150,19 +223,24 @@ async def stream_all_events_to_classifier(data_dir: str):
         sys.exit(1)
 
     print(f"🔍 Loading data from: {data_dir}")
-    all_events = []
+    per_file = []
 
     for root, _, files in os.walk(data_dir):
         for filename in files:
             if filename.lower().endswith(".csv"):
                 full_path = os.path.join(root, filename)
-                all_events.extend(extract_events_from_file(full_path))
+                events = extract_events_from_file(full_path)
+                if events:
+                    # Nearly free for files already in time order; both sorts are stable,
+                    # so ties keep the file-then-row order a single global sort gave
+                    events.sort(key=itemgetter(0))
+                    per_file.append(events)
     
-    if not all_events:
+    if not per_file:
         print("No events found to stream.")
         return
 
-    await stream_sorted_events(all_events)
+    await stream_sorted_events(heapq.merge(*per_file, key=itemgetter(0)))
 
 async def main():
     """Main function to run the streamer as a standalone script."""
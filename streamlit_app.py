@@ -12,6 +12,17 @@ from chat_agent import ChatAgent
 from autonomous_decision_agent import AutonomousDecisionAgent
 from detector import ANOMALY_LOG
 
+@st.cache_data(show_spinner=False, max_entries=8)
+def _read_jsonl(path, mtime_ns, size):
+    # pandas' C JSON reader; no dtype or date inference, so the frame matches
+    # pd.DataFrame([json.loads(line) ...]) column for column
+    return pd.read_json(path, lines=True, dtype=False, convert_dates=False)
+
+def load_jsonl(path):
+    # Reparse only when the file changes; cache_data returns a copy, so callers may mutate it
+    info = os.stat(path)
+    return _read_jsonl(path, info.st_mtime_ns, info.st_size)
+
 st.set_page_config(page_title="Lunar Agent Dashboard", layout="wide")
 st.title("🌕 Lunar Agriculture Pod Agent Dashboard")
 
@@ -52,17 +63,15 @@ with tabs[1]:
         if os.path.exists(path):
             found_log = True
             st.markdown(f"### Log File: `{os.path.basename(path)}`")
-            with open(path, 'r') as f:
-                rows = [json.loads(line) for line in f.readlines()]
-                df = pd.DataFrame(rows)
-                if not df.empty:
-                    df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601', errors='coerce')
-                    df.sort_values('timestamp', ascending=False, inplace=True)
-                    st.dataframe(df)
-                    if 'value' in df.columns:
-                        st.line_chart(df.set_index('timestamp')['value'])
-                else:
-                    st.info("This anomaly log is empty.")
+            df = load_jsonl(path)
+            if not df.empty:
+                df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601', errors='coerce')
+                df.sort_values('timestamp', ascending=False, inplace=True)
+                st.dataframe(df)
+                if 'value' in df.columns:
+                    st.line_chart(df.set_index('timestamp')['value'])
+            else:
+                st.info("This anomaly log is empty.")
         else:
             st.warning(f"Log file not found: {path}")
     if not found_log:
@@ -75,15 +84,13 @@ with tabs[2]:
         st.rerun()
     decision_log = "data/last_decision.jsonl"
     if os.path.exists(decision_log):
-        with open(decision_log, "r") as f:
-            entries = [json.loads(line) for line in f.readlines()]
-            df = pd.DataFrame(entries)
-            if not df.empty:
-                df["timestamp"] = pd.to_datetime(df["timestamp"], format='ISO8601', errors='coerce')
-                df.sort_values("timestamp", ascending=False, inplace=True)
-                st.dataframe(df)
-            else:
-                st.info("Decision history is empty.")
+        df = load_jsonl(decision_log)
+        if not df.empty:
+            df["timestamp"] = pd.to_datetime(df["timestamp"], format='ISO8601', errors='coerce')
+            df.sort_values("timestamp", ascending=False, inplace=True)
+            st.dataframe(df)
+        else:
+            st.info("Decision history is empty.")
     else:
         st.warning("No decision history file found.")
 
@@ -91,7 +98,10 @@ with tabs[2]:
 import time
 with tabs[3]:
     st.subheader("💬 Chat with MCPAgent")
-    agent = ChatAgent()
+    # One agent per session; reruns reuse it instead of rebuilding it
+    if "chat_agent" not in st.session_state:
+        st.session_state.chat_agent = ChatAgent()
+    agent = st.session_state.chat_agent
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
     if "animated_until" not in st.session_state:
@@ -1,3 +1,4 @@
+import heapq
 import json
 from typing import Optional
 from langchain_core.tools import tool
@@ -5,16 +6,14 @@ from langchain_core.tools import tool
 # === Read Anomaly Logs (with optional sensor filtering) ===
 def get_recent_anomalies(n: int = 5, sensor: Optional[str] = None) -> str:
     try:
+        # Stream the log and keep only the n newest entries by timestamp; the file is not
+        # guaranteed to be in time order, so a tail read would not give the same result
         with open("anomaly_log.jsonl", "r") as f:
-            lines = [line.strip() for line in f if line.strip()]
-
-        entries = [json.loads(line) for line in lines]
-        if sensor:
-            entries = [e for e in entries if e.get("sensor") == sensor]
-
-        # Sort by timestamp descending
-        entries.sort(key=lambda x: x["timestamp"], reverse=True)
-        latest = entries[:n]
+            entries = (json.loads(line) for line in f if not line.isspace())
+            if sensor:
+                entries = (e for e in entries if e.get("sensor") == sensor)
+            # Same result as a stable descending sort followed by [:n]
+            latest = heapq.nlargest(n, entries, key=lambda x: x["timestamp"])
 
         if not latest:
             return f"🔍 No anomalies found for sensor '{sensor}'." if sensor else "🔍 No anomalies found."